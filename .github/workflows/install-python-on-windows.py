@@ -1,6 +1,6 @@
-import io
 import os
 import shutil
+import tempfile
 import zipfile
 
 import requests
@@ -8,9 +8,14 @@ import requests
 os.makedirs("nasm", exist_ok = True)
 
 url = "https://www.nasm.us/pub/nasm/releasebuilds/2.16.01/win64/nasm-2.16.01-win64.zip"
-response = requests.get(url)
-with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
-    for path in archive.namelist():
-        if path.endswith("nasm.exe"):
-            with open("nasm/nasm.exe", "wb") as file:
-                file.write(archive.open(path).read())
+# Stream the archive into a temporary file instead of holding response.content and a BytesIO copy of it in memory.
+with requests.get(url, stream=True) as response, tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as buffer:
+    response.raise_for_status()
+    for chunk in response.iter_content(chunk_size=1024 * 1024):
+        buffer.write(chunk)
+    buffer.seek(0)
+    with zipfile.ZipFile(buffer) as archive:
+        for path in archive.namelist():
+            if path.endswith("nasm.exe"):
+                with archive.open(path) as source, open("nasm/nasm.exe", "wb") as file:
+                    shutil.copyfileobj(source, file)
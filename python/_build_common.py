@@ -0,0 +1,284 @@
+"""
+Compiler probes and compiler flags, which are shared by the setup.py of rapidgzip and indexed_bzip2.
+This file is symlinked into both Python package folders, similarly to the C++ sources.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from distutils.errors import CompileError
+
+
+# Compiler probes are expensive because each one spawns the compiler. Cache their results in-process per compiler
+# command line and on disk per compiler version so that repeated builds, e.g., editable installs, can skip them.
+probeResults = {}
+
+
+def getCompilerCommand(compiler):
+    # MSVCCompiler has no compiler_so attribute.
+    return ' '.join(getattr(compiler, 'compiler_so', None) or [compiler.compiler_type])
+
+
+def getCompilerVersion(compiler):
+    command = getattr(compiler, 'compiler_so', None)
+    if command and os.path.basename(command[0]).split('.')[0] in compilerLaunchers:
+        command = command[1:]
+    if not command:
+        return ''
+    try:
+        return subprocess.run(
+            command[:1] + ['--version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+        ).stdout.decode()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+compilerLaunchers = ['ccache', 'sccache']
+
+
+def wrapWithCompilerCache(compiler):
+    """
+    Prepends ccache or sccache to the compiler command so that rebuilds with unchanged sources and flags
+    become cache hits. Only the compiler is wrapped, not the linker and not NASM.
+    """
+    if compiler.compiler_type == 'msvc':
+        # MSVCCompiler spawns [self.cc] + arguments and only sets self.cc in its lazy initialize call.
+        launcher = shutil.which('sccache')
+        if not launcher:
+            return
+        oldSpawn = compiler.spawn
+
+        def spawn(command, *args, **kwargs):
+            if command and command[0] == getattr(compiler, 'cc', None):
+                command = [launcher] + list(command)
+            return oldSpawn(command, *args, **kwargs)
+
+        compiler.spawn = spawn
+    else:
+        launcher = shutil.which('ccache') or shutil.which('sccache')
+        if not launcher:
+            return
+        # Do not wrap compiler_cxx. It is only used to build the link command, and the distutils versions used by
+        # setuptools < 60 only replace the first word of the linker with it, which would result in 'ccache -shared'.
+        for name in ['compiler', 'compiler_so']:
+            command = getattr(compiler, name, None)
+            if command and os.path.basename(command[0]).split('.')[0] not in compilerLaunchers:
+                setattr(compiler, name, [launcher] + command)
+
+    # Avoid spurious cache misses because of __DATE__ and __TIME__ usages, e.g., in the ISA-L or zlib sources.
+    os.environ.setdefault('CCACHE_SLOPPINESS', 'time_macros,pch_defines')
+    print("[Info] Using compiler cache:", launcher)
+
+
+def getStableBuildTemp(buildTemp, editableMode):
+    # Editable installs (PEP 660) set build_temp to a fresh temporary folder for each build. This throws away the
+    # object files, which makes the timestamp checks for incremental rebuilds and the on-disk probe cache useless.
+    # Use a folder next to the sources that only depends on the interpreter version and architecture instead.
+    if not editableMode:
+        return buildTemp
+    return os.path.join('build', f'ext-{sys.version_info.major}{sys.version_info.minor}-{platform.machine()}')
+
+
+def getProbeCachePath(compiler, buildTemp):
+    version = getCompilerCommand(compiler) + getCompilerVersion(compiler)
+    versionHash = hashlib.sha256(version.encode()).hexdigest()
+    return os.path.join(os.path.dirname(buildTemp) or '.', f".flag-probe-cache-{versionHash}.json")
+
+
+def loadProbeCache(path):
+    try:
+        with open(path, 'rt') as file:
+            probeResults.update(json.load(file))
+    except (OSError, ValueError):
+        pass
+
+
+def storeProbeCache(path):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wt') as file:
+            json.dump(probeResults, file, indent=1, sort_keys=True)
+    except OSError as exception:
+        print("[Info] Could not write compiler probe cache:", exception)
+
+
+def getProbeKey(compiler, key):
+    return getCompilerCommand(compiler) + '\n' + key
+
+
+def cachedProbe(compiler, key, probe):
+    cacheKey = getProbeKey(compiler, key)
+    if cacheKey not in probeResults:
+        probeResults[cacheKey] = probe()
+    return probeResults[cacheKey]
+
+
+def prefetchProbes(compiler, flags=(), systemIncludes=()):
+    """
+    Runs all not yet cached flag and header probes in parallel so that the following supportsFlag and hasInclude
+    calls only look up the results. This is only done for compilers that can be probed via stdin because the
+    other compilers, e.g., MSVCCompiler, lazily initialize themselves on the first compile call.
+    """
+    if compiler.compiler_type != 'unix':
+        return
+
+    probes = {flag: lambda flag=flag: probeFlag(compiler, flag) for flag in flags}
+    for include in systemIncludes:
+        probes[f'#include <{include}>'] = lambda include=include: probeInclude(compiler, include)
+    probes = {key: probe for key, probe in probes.items() if getProbeKey(compiler, key) not in probeResults}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(lambda probe: probe(), probes.values())
+        for key, result in zip(probes.keys(), results):
+            probeResults[getProbeKey(compiler, key)] = result
+
+
+def supportsFlag(compiler, flag):
+    return cachedProbe(compiler, flag, lambda: probeFlag(compiler, flag))
+
+
+def compileFromStdin(compiler, source, extraArgs=None):
+    """
+    Compiles the C++ source piped via stdin without creating any temporary files.
+    Returns whether the compilation succeeded or None if the compiler does not support this.
+    """
+    command = getattr(compiler, 'compiler_so', None)
+    if compiler.compiler_type != 'unix' or not command:
+        return None
+    try:
+        result = subprocess.run(
+            command + (extraArgs or []) + ['-x', 'c++', '-c', '-', '-o', os.devnull],
+            input=source.encode(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+    return result.returncode == 0
+
+
+def probeFlag(compiler, flag):
+    supported = compileFromStdin(compiler, 'int main() { return 0; }', [flag])
+    if supported is not None:
+        return supported
+
+    with tempfile.NamedTemporaryFile('w', suffix='.cpp') as file:
+        file.write('int main() { return 0; }')
+        try:
+            compiler.compile([file.name], extra_postargs=[flag])
+        except CompileError:
+            print("[Info] Compiling with argument failed. Will try another one. The above error can be ignored!")
+            return False
+    return True
+
+
+def getLtoFlags(compiler):
+    # ThinLTO links much faster than full LTO with Clang. GCC does not know -flto=thin and only
+    # parallelizes the link-time optimization with -flto=auto.
+    for flag in ['-flto=thin', '-flto=auto', '-flto']:
+        if supportsFlag(compiler, flag):
+            return [flag]
+    return []
+
+
+def hasInclude(compiler, systemInclude):
+    return cachedProbe(compiler, f'#include <{systemInclude}>', lambda: probeInclude(compiler, systemInclude))
+
+
+def probeInclude(compiler, systemInclude):
+    found = compileFromStdin(compiler, f'#include <{systemInclude}>\n' + 'int main() { return 0; }')
+    if found is not None:
+        return found
+
+    with tempfile.NamedTemporaryFile('w', suffix='.cpp') as file:
+        file.write(f'#include <{systemInclude}>\n' + 'int main() { return 0; }')
+        try:
+            compiler.compile([file.name])
+        except CompileError:
+            print(
+                f"[Info] Check for {systemInclude} system header failed. Will try without out it. "
+                "The above error can be ignored!"
+            )
+            return False
+    return True
+
+
+def getVisibilityFlags(compiler):
+    # Only PyInit_<module> has to be exported from the extension. Hidden symbols and no semantic interposition
+    # allow the compiler to call and inline functions directly instead of going through the PLT and GOT.
+    flags = ['-fno-semantic-interposition', '-fno-plt']
+    # PyMODINIT_FUNC marks the module init function with default visibility only since Python 3.9.
+    if sys.version_info >= (3, 9):
+        flags.append('-fvisibility=hidden')
+    return [flag for flag in flags if supportsFlag(compiler, flag)]
+
+
+def getLinkerFlags(debug=False):
+    if sys.platform.startswith('darwin'):
+        return ['-Wl,-dead_strip']
+    if sys.platform.startswith('linux'):
+        # Remove unused sections and library dependencies and resolve all symbols at load time so that the
+        # relocations can be made read-only.
+        flags = ['-Wl,--gc-sections', '-Wl,--as-needed', '-Wl,-z,now', '-Wl,-z,relro']
+        # Strip the symbol table, which is not needed by the module loader, but keep it for debugging and profiling.
+        userFlags = os.environ.get('CFLAGS', '').split() + os.environ.get('CXXFLAGS', '').split()
+        if not debug and not any(flag.startswith('-g') and flag != '-g0' for flag in userFlags):
+            flags.append('-Wl,--strip-all')
+        return flags
+    return []
+
+
+def getUnixFlags(compiler, debug=False):
+    """
+    Returns the compile arguments for all sources, the compile arguments only for C++ sources, and the linker
+    arguments, which are added for GCC and Clang to all extensions.
+    """
+    compileArgs = []
+    cxxCompileArgs = []
+    linkArgs = []
+
+    # fmt: off
+    prefetchProbes(compiler, [
+        '-fcf-protection=full', '-flto=thin', '-flto=auto', '-flto',
+        '-fno-semantic-interposition', '-fno-plt', '-fvisibility=hidden', '-fvisibility-inlines-hidden',
+        '-ffunction-sections', '-fdata-sections', '-pipe', '-mmacosx-version-min=10.14',
+    ])
+    # fmt: on
+
+    # Add some hardening. See e.g.:
+    # https://www.phoronix.com/news/GCC-fhardened-Hardening-Option
+    # https://developers.redhat.com/blog/2018/03/21/compiler-and-linker-flags-gcc
+    # I have not observed any performance impact for these.
+    compileArgs += ['-fstack-protector-strong']
+    linkArgs += ['-fstack-clash-protection']
+    # AppleClang seems to not like this flag:
+    if supportsFlag(compiler, '-fcf-protection=full'):
+        compileArgs += ['-fcf-protection=full']
+
+    ltoFlags = getLtoFlags(compiler)
+    compileArgs += ltoFlags
+    linkArgs += ltoFlags
+
+    compileArgs += getVisibilityFlags(compiler)
+    if supportsFlag(compiler, '-fvisibility-inlines-hidden'):
+        cxxCompileArgs += ['-fvisibility-inlines-hidden']
+
+    # Put each function and variable into its own section so that the linker can remove unused ones.
+    compileArgs += [flag for flag in ['-ffunction-sections', '-fdata-sections'] if supportsFlag(compiler, flag)]
+    linkArgs += getLinkerFlags(debug)
+
+    # Pass the intermediary assembler output via pipes instead of temporary files.
+    if supportsFlag(compiler, '-pipe'):
+        compileArgs += ['-pipe']
+
+    if sys.platform.startswith('darwin') and supportsFlag(compiler, '-mmacosx-version-min=10.14'):
+        compileArgs += ['-mmacosx-version-min=10.14']
+        linkArgs += ['-mmacosx-version-min=10.14']
+
+    return compileArgs, cxxCompileArgs, linkArgs
@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import platform
 import sys
-import tempfile
-from distutils.errors import CompileError
 
 from setuptools import setup
 from setuptools.extension import Extension
 from setuptools.command.build_ext import build_ext
 
+# The setuptools legacy backend and 'python setup.py' add this folder to the path but other tools, which simply
+# execute this file, e.g., conda's load_setup_py_data, might not.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _build_common import (  # noqa: E402
+    getProbeCachePath,
+    getStableBuildTemp,
+    getUnixFlags,
+    loadProbeCache,
+    storeProbeCache,
+    supportsFlag,
+    wrapWithCompilerCache,
+)
+
 # This fallback is only for jinja, which is used by conda to analyze this setup.py before any build environment
 # is set up.
 try:
@@ -30,23 +42,38 @@ extensions = [
 ]
 
 if cythonize:
-    extensions = cythonize(extensions, compiler_directives={'language_level': '3'})
-
-
-def supportsFlag(compiler, flag):
-    with tempfile.NamedTemporaryFile('w', suffix='.cpp') as file:
-        file.write('int main() { return 0; }')
-        try:
-            compiler.compile([file.name], extra_postargs=[flag])
-        except CompileError:
-            print("[Info] Compiling with argument failed. Will try another one. The above error can be ignored!")
-            return False
-    return True
+    # The bindings only index into buffers with non-negative, already checked indexes and do not divide negative
+    # integers. Therefore, disable the checks for Python semantics, which Cython would otherwise generate.
+    extensions = cythonize(
+        extensions,
+        compiler_directives={
+            'language_level': '3str',
+            'boundscheck': False,
+            'wraparound': False,
+            'initializedcheck': False,
+            'cdivision': True,
+            'infer_types': True,
+        },
+    )
 
 
 # https://github.com/cython/cython/blob/master/docs/src/tutorial/appendix.rst#python-38
 class Build(build_ext):
+    def finalize_options(self):
+        super(Build, self).finalize_options()
+        self.build_temp = getStableBuildTemp(self.build_temp, getattr(self, 'editable_mode', False))
+
     def build_extensions(self):
+        wrapWithCompilerCache(self.compiler)
+
+        probeCachePath = getProbeCachePath(self.compiler, self.build_temp)
+        loadProbeCache(probeCachePath)
+
+        # There is only one compiler per build_extensions call, so probe these only once for all extensions.
+        unixCompileArgs, unixCxxCompileArgs, unixLinkArgs = [], [], []
+        if self.compiler.compiler_type not in ['mingw32', 'msvc']:
+            unixCompileArgs, unixCxxCompileArgs, unixLinkArgs = getUnixFlags(self.compiler, self.debug)
+
         for ext in self.extensions:
             ext.extra_compile_args = [
                 '-std=c++17',
@@ -75,33 +102,25 @@ class Build(build_ext):
                 ]
 
             elif self.compiler.compiler_type == 'msvc':
+                # setuptools' MSVCCompiler already adds /GL and /LTCG, i.e., link-time code generation. Add the
+                # equivalents of -ffunction-sections -fdata-sections -Wl,--gc-sections so that the linker can drop
+                # and fold unreferenced functions and data.
                 ext.extra_compile_args = [
                     '/std:c++17',
                     '/O2',
+                    '/Gy',
+                    '/Gw',
                     '/DNDEBUG',
                     '/DWITH_PYTHON_SUPPORT',
-                    '/constexpr:steps99000100',
                 ]
+                ext.extra_link_args = ['/OPT:REF', '/OPT:ICF']
             else:
-                # The default limit is ~33 M (1<<25) and 99 M seem to be enough to compile currently on GCC 11.
-                if supportsFlag(self.compiler, '-fconstexpr-ops-limit=99000100'):
-                    ext.extra_compile_args += ['-fconstexpr-ops-limit=99000100']
-                elif supportsFlag(self.compiler, '-fconstexpr-steps=99000100'):
-                    ext.extra_compile_args += ['-fconstexpr-steps=99000100']
-
-                # Add some hardening. See e.g.:
-                # https://www.phoronix.com/news/GCC-fhardened-Hardening-Option
-                # https://developers.redhat.com/blog/2018/03/21/compiler-and-linker-flags-gcc
-                # I have not observed any performance impact for these.
-                ext.extra_compile_args += ['-fstack-protector-strong']
-                ext.extra_link_args += ['-fstack-clash-protection']
-                # AppleClang seems to not like this flag:
-                if supportsFlag(self.compiler, '-fcf-protection=full'):
-                    ext.extra_compile_args += ['-fcf-protection=full']
-
-                if sys.platform.startswith('darwin') and supportsFlag(self.compiler, '-mmacosx-version-min=10.14'):
-                    ext.extra_compile_args += ['-mmacosx-version-min=10.14']
-                    ext.extra_link_args += ['-mmacosx-version-min=10.14']
+                # In contrast to rapidgzip, no raised constexpr limit is necessary because the large constexpr
+                # lookup tables are only used by the deflate block finder.
+                ext.extra_compile_args += unixCompileArgs + unixCxxCompileArgs
+                ext.extra_link_args += unixLinkArgs
+
+        storeProbeCache(probeCachePath)
 
         super(Build, self).build_extensions()
 
@@ -0,0 +1 @@
+../_build_common.py
\ No newline at end of file
@@ -2,10 +2,13 @@
 Distutils doesn't support nasm, so this is a custom compiler for NASM
 """
 
-from distutils.errors import CompileError, DistutilsExecError
-from distutils.unixccompiler import UnixCCompiler
-from distutils.sysconfig import get_config_var
+from setuptools._distutils.errors import CompileError
+from setuptools._distutils.unixccompiler import UnixCCompiler
+from setuptools._distutils.sysconfig import get_config_var
+import concurrent.futures
+import os
 import platform
+import subprocess
 import sys
 
 
@@ -51,14 +54,33 @@ class NasmCompiler(UnixCCompiler) :
         return cc_args
 
 
+    def compile(self, sources, output_dir=None, macros=None,
+                include_dirs=None, debug=0, extra_preargs=None,
+                extra_postargs=None, depends=None):
+        # Same as CCompiler.compile but assembles the sources in parallel instead of one after another.
+        macros, objects, extra_postargs, pp_opts, build = \
+            self._setup_compile(output_dir, macros, include_dirs, sources, depends, extra_postargs)
+        cc_args = self._get_cc_args(pp_opts, debug, extra_preargs)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = [executor.submit(self._compile, obj, src, ext, cc_args, extra_postargs, pp_opts)
+                       for obj, (src, ext) in build.items()]
+            for future in futures:
+                # Rethrows the CompileError of the first failed source.
+                future.result()
+
+        return objects
+
     def _compile(self, obj, src, ext, cc_args, extra_postargs, pp_opts):
         # The implementation in UnixCCompiler calls compiler_fixup here.
         # But it is not needed for NASM and actually leads to build errors on MacOS
         # because it adds a non-NASM option "-arch ...".
+        # Call NASM directly instead of via the distutils spawn wrapper, which does not add anything for NASM.
+        command = self.compiler_so + cc_args + [src, '-o', obj] + extra_postargs
         try:
-            self.spawn(self.compiler_so + cc_args + [src, '-o', obj] + extra_postargs)
-        except DistutilsExecError as msg:
-            raise CompileError(msg)
+            subprocess.run(command, check=True)
+        except (OSError, subprocess.CalledProcessError) as exception:
+            raise CompileError(exception)
 
     def link(self, target_desc, objects,
              output_filename, output_dir=None, libraries=None,
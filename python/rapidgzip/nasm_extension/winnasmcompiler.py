@@ -1,10 +1,14 @@
 """
 Distutils doesn't support nasm, so this is a custom compiler for NASM
 """
-from distutils.errors import DistutilsExecError, CompileError
+from setuptools._distutils.errors import DistutilsExecError, CompileError
 
-from distutils.msvc9compiler import MSVCCompiler
+# distutils.msvc9compiler has been removed together with distutils in Python 3.12 and was also dropped from newer
+# setuptools versions. _msvccompiler is the implementation that setuptools itself uses for MSVC.
+from setuptools._distutils._msvccompiler import MSVCCompiler
+import concurrent.futures
 import os
+import shutil
 
 
 class WinNasmCompiler(MSVCCompiler):
@@ -19,6 +23,8 @@ class WinNasmCompiler(MSVCCompiler):
         MSVCCompiler.__init__(self, verbose, dry_run, force)
 
     def initialize(self, plat_name=None):
+        # Used by MSVCCompiler.spawn as PATH for the subprocess.
+        self._paths = os.environ.get('PATH', '')
         self.cc = self.find_exe("nasm.exe")
         self.linker = self.find_exe("link.exe")
         self.lib = self.find_exe("lib.exe")
@@ -32,6 +38,10 @@ class WinNasmCompiler(MSVCCompiler):
         self.ldflags_static = ['/nologo']
         self.initialized = True
 
+    def find_exe(self, exe):
+        # The msvc9compiler base class provided this but the newer _msvccompiler does not.
+        return shutil.which(exe, path=self._paths) or exe
+
     def link(self, target_desc, objects,
              output_filename, output_dir=None, libraries=None,
              library_dirs=None, runtime_library_dirs=None,
@@ -61,11 +71,7 @@ class WinNasmCompiler(MSVCCompiler):
         else:
             compile_opts.extend(self.compile_options)
 
-        for obj in objects:
-            try:
-                src, ext = build[obj]
-            except KeyError:
-                continue
+        def assemble(obj, src):
             if debug:
                 # pass the full pathname to MSVC in debug mode,
                 # this allows the debugger to find the source file
@@ -81,4 +87,17 @@ class WinNasmCompiler(MSVCCompiler):
             except DistutilsExecError as msg:
                 raise CompileError(msg)
 
+        # Process creation is slow on Windows, so assemble the sources in parallel.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = []
+            for obj in objects:
+                try:
+                    src, ext = build[obj]
+                except KeyError:
+                    continue
+                futures.append(executor.submit(assemble, obj, src))
+            for future in futures:
+                # Rethrows the CompileError of the first failed source.
+                future.result()
+
         return objects
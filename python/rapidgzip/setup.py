@@ -1,18 +1,35 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import concurrent.futures
 import copy
 import os
 import platform
 import shutil
+import subprocess
 import sys
 import tempfile
-from distutils.errors import CompileError
 
 from setuptools import setup
 from setuptools.extension import Extension
 from setuptools.command.build_ext import build_ext
 
+# The setuptools legacy backend and 'python setup.py' add this folder to the path but other tools, which simply
+# execute this file, e.g., conda's load_setup_py_data, might not.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _build_common import (  # noqa: E402
+    getCompilerVersion,
+    getProbeCachePath,
+    getStableBuildTemp,
+    getUnixFlags,
+    hasInclude,
+    loadProbeCache,
+    prefetchProbes,
+    storeProbeCache,
+    supportsFlag,
+    wrapWithCompilerCache,
+)
+
 # This fallback is only for jinja, which is used by conda to analyze this setup.py before any build environment
 # is set up.
 try:
@@ -31,6 +48,16 @@ except ImportError:
 #   system
 # Not specifying and option, implies 'enable', which will use the packaged source code for each dependency.
 # cxxopts can not be disabled!
+# Valid options for optimizations:
+#   RAPIDGZIP_BUILD_NATIVE
+#   RAPIDGZIP_BUILD_PGO
+# Valid values for optimizations:
+#   enable
+#   disable
+# Not specifying an option, implies 'disable'. Profile-guided optimization (PGO) builds the extension twice and
+# runs a short decompression benchmark in between. It is only supported for GCC and Clang.
+# NATIVE compiles with -march=native for GCC and Clang. The resulting extension might not run on other CPUs, so it
+# must not be enabled for distributed wheels. ISA-L selects its SIMD kernels at runtime either way.
 optionsPrefix = 'RAPIDGZIP_BUILD_'
 buildConfig = {key: value for key, value in os.environ.items() if key.startswith(optionsPrefix)}
 print("\nRapidgzip build options:")
@@ -51,6 +78,8 @@ withCxxopts = getDependencyOption('CXXOPTS')
 withIsal = getDependencyOption('ISAL')
 withRpmalloc = getDependencyOption('RPMALLOC')
 withZlib = getDependencyOption('ZLIB')
+withPgo = 'enable' if buildConfig.get(optionsPrefix + 'PGO', 'disable') == 'enable' else 'disable'
+withNative = 'enable' if buildConfig.get(optionsPrefix + 'NATIVE', 'disable') == 'enable' else 'disable'
 
 if withCxxopts == 'disable':
     print("[Warning] Cxxopts can not be disabled! Will enable it.")
@@ -68,17 +97,54 @@ canBuildIsal = shutil.which("nasm") is not None and platform.machine() in ['x86_
 if not canBuildIsal:
     withIsal = 'disable'
 
+
+def nasmSupportsAvx512():
+    # ISA-L compiles its AVX-512 kernels, e.g., crc32_gzip_refl_by16_10.asm, and the corresponding branches in the
+    # multibinary dispatchers only if AS_FEATURE_LEVEL >= 10. It defaults to 4, i.e., AVX2, because older assemblers,
+    # e.g., NASM 2.10 in the manylinux2014 image, do not know the AVX-512 instructions. Check the same instructions
+    # as ISA-L's configure.ac.
+    source = "\n".join(
+        ["bits 64", "vpcompressb zmm0 {k1}, zmm1", "vpshufbitqmb k1, zmm1, zmm2", "vpclmulqdq zmm0, zmm1, zmm2, 0x00", ""]
+    )
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'avx512.asm')
+        with open(path, 'w') as file:
+            file.write(source)
+        command = [shutil.which("nasm"), '-f', 'bin', path, '-o', os.path.join(folder, 'avx512.bin')]
+        return subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+
+# With these macros, the dispatchers additionally reference crc32_gzip_refl_by16_10 in crc_multibinary.asm as well as
+# encode_deflate_icf_06, set_long_icf_fg_06, and gen_icf_map_lh1_06 in igzip_multibinary.asm. These are defined in
+# crc32_gzip_refl_by16_10.asm, encode_df_06.asm, igzip_set_long_icf_fg_06.asm, and igzip_gen_icf_map_lh1_06.asm,
+# which must therefore stay in isal_sources. Otherwise, importing the module would fail because of undefined symbols.
+# The same macros are set in src/CMakeLists.txt.
+isal_asm_macros = []
+if withIsal == 'enable' and nasmSupportsAvx512():
+    isal_asm_macros = [('AS_FEATURE_LEVEL', '10'), ('HAVE_AS_KNOWS_AVX512', None)]
+
 print("Final rapidgzip build configuration:")
-print(f"  isal: {withIsal}")
+print(f"  isal: {withIsal}" + (" (with AVX-512)" if isal_asm_macros else ""))
 print(f"  zlib: {withZlib}")
 print(f"  rpmalloc: {withRpmalloc}")
 print(f"  cxxopts: {withCxxopts}")
-
+print(f"  pgo: {withPgo}")
+
+# zlib is only used as a fallback for raw deflate decompression when ISA-L is not available and for compressing
+# indexes. Gzip checksums are computed by rapidgzip itself, via crc32_gzip_refl from ISA-L if available. The raw
+# deflate streams, which are decompressed with zlib, have no checksum. Therefore, a SIMD-accelerated zlib fork would
+# not speed up the gzip CRC32 computation.
+# Compiling the stock zlib sources with -mpclmul -msse4.2 would not help either because they contain no PCLMUL or
+# SSE4.2 code path to enable. It would only allow the compiler to emit these instructions anywhere in zlib without
+# a runtime CPUID check and thereby break the wheels on x86-64 baseline CPUs.
 zlib_sources = []
 if withZlib == 'enable':
     zlib_sources = ['deflate.c', 'inflate.c', 'crc32.c', 'adler32.c', 'inftrees.c', 'inffast.c', 'trees.c', 'zutil.c']
     zlib_sources = ['external/zlib/' + source for source in zlib_sources]
 
+# Instruction set extensions are not selected at compile time. The *_multibinary.asm files dispatch at runtime via
+# CPUID to the SSE, AVX2, or AVX-512 variants of the CRC32 and Huffman decoding kernels listed below. This way, the
+# wheels can be built for the x86-64 baseline and still use the fastest kernel available on the executing CPU.
 isal_sources = [
     # "include/igzip_lib.h",
     # "include/unaligned.h",
@@ -149,6 +215,18 @@ isal_sources = [
 ]
 isal_sources = ['external/isa-l/' + source for source in isal_sources] if withIsal == 'enable' else []
 
+# These C sources contain the inner Huffman decoding and checksum loops. The stack protector adds canary checks to
+# every function with local arrays, e.g., the decoding tables, and FORTIFY_SOURCE adds checks to memcpy calls with
+# unknown sizes. Hardening is therefore disabled for them. The C++ code is compiled as one translation unit together
+# with the Python bindings and keeps the hardening flags.
+hot_sources = [
+    'external/zlib/inflate.c',
+    'external/zlib/inffast.c',
+    'external/zlib/crc32.c',
+    'external/isa-l/igzip/igzip_inflate.c',
+    'external/isa-l/crc/crc_base.c',
+]
+
 include_dirs = [
     '.',
     'core',
@@ -183,36 +261,47 @@ extensions = [
 ]
 
 if cythonize:
-    extensions = cythonize(extensions, compiler_directives={'language_level': '3'})
-
-
-def supportsFlag(compiler, flag):
-    with tempfile.NamedTemporaryFile('w', suffix='.cpp') as file:
-        file.write('int main() { return 0; }')
-        try:
-            compiler.compile([file.name], extra_postargs=[flag])
-        except CompileError:
-            print("[Info] Compiling with argument failed. Will try another one. The above error can be ignored!")
-            return False
-    return True
-
-
-def hasInclude(compiler, systemInclude):
-    with tempfile.NamedTemporaryFile('w', suffix='.cpp') as file:
-        file.write(f'#include <{systemInclude}>\n' + 'int main() { return 0; }')
-        try:
-            compiler.compile([file.name])
-        except CompileError:
-            print(
-                f"[Info] Check for {systemInclude} system header failed. Will try without out it. "
-                "The above error can be ignored!"
-            )
-            return False
-    return True
+    # The bindings only index into buffers with non-negative, already checked indexes and do not divide negative
+    # integers. Therefore, disable the checks for Python semantics, which Cython would otherwise generate.
+    extensions = cythonize(
+        extensions,
+        compiler_directives={
+            'language_level': '3str',
+            'boundscheck': False,
+            'wraparound': False,
+            'initializedcheck': False,
+            'cdivision': True,
+            'infer_types': True,
+        },
+    )
+
+
+# The training run for profile-guided optimization. Base64-encoded random data is also used for the benchmarks
+# in the paper. It is compressible enough to exercise the Huffman decoding and the parallelized chunk decoding.
+pgoTrainingScript = """
+import base64, gzip, io, os
+import rapidgzip
+
+data = base64.b64encode(os.urandom(6 * 1024 * 1024))
+for compressionLevel in [1, 6, 9]:
+    compressed = gzip.compress(data, compressionLevel)
+    for parallelization in [1, os.cpu_count()]:
+        with rapidgzip.open(io.BytesIO(compressed), parallelization=parallelization) as file:
+            assert file.read() == data
+"""
 
 
 # https://github.com/cython/cython/blob/master/docs/src/tutorial/appendix.rst#python-38
 class Build(build_ext):
+    def finalize_options(self):
+        super(Build, self).finalize_options()
+        self.build_temp = getStableBuildTemp(self.build_temp, getattr(self, 'editable_mode', False))
+
+    def build_extension(self, ext):
+        # The compile method does not get to know the extension, so remember it for newCompile.
+        self.currentExtension = ext
+        return super(Build, self).build_extension(ext)
+
     def build_extensions(self):
         # This is as hacky as it gets just in order to have different compile arguments for the zlib C-code as
         # opposed to the C++ code but I don't see another way with this subpar "build system" if you can call
@@ -239,57 +328,98 @@ class Build(build_ext):
             if asmSources and nasmCompiler:
                 nasm_kwargs = copy.deepcopy(kwargs)
                 nasm_kwargs['extra_postargs'] = []
-                nasm_kwargs['include_dirs'] = isal_includes
-
-                # One of the crudest hacks ever. But for some reason, I get:
-                # fatal: unable to open include file `reg_sizes.asm'
-                # But this only happens with the manylinux2014 image. Building with cibuildwheel and manylinux2_28
-                # works perfectly fine without this hack. Maybe it is a problem with 2.10.07-7.el7 (manylinux2014),
-                # which has been fixed in 2.15.03-3.el8 (manylinux_2_28).
+                nasm_kwargs['macros'] = (nasm_kwargs.get('macros') or []) + isal_asm_macros
+                # NASM before 2.14 simply prepends the -I argument to the include file name without adding a path
+                # separator, i.e., -Iexternal/isa-l/include makes it try to open external/isa-l/includereg_sizes.asm:
+                #   fatal: unable to open include file `reg_sizes.asm'
+                # This happened with NASM 2.10.07-7.el7 in the manylinux2014 image. It was worked around by copying
+                # all includable .asm files into the current directory. Since 2.14, NASM adds the trailing path
+                # separator unconditionally, so always adding it ourselves works with all versions.
                 # @see https://www.nasm.us/xdoc/2.16.01/html/nasmdocc.html#section-C.1.32
-                # The only mention of -I, which I could find, is in 2.14:
-                # > Changed -I option semantics by adding a trailing path separator unconditionally.
-                # It even fails to include .asm files in the same directory as the .asm file to be compiled.
-                #   nasm -I. -Iexternal/isa-l/include -Iexternal/isa-l/igzip -f elf64 \
-                #       external/isa-l/igzip/igzip_decode_block_stateless_01.asm -o \
-                #       build/temp.linux-x86_64-3.6/external/isa-l/igzip/igzip_decode_block_stateless_01.obj
-                # external/isa-l/igzip/igzip_decode_block_stateless_01.asm:3: fatal: unable to open include file
-                #   `igzip_decode_block_stateless.asm'
-                # error: command 'nasm' failed with exit status 1
-                # I even tried chaning -I<dir> to -I <dir> by overwriting nasmcompiler._setup_compile but to no avail.
-                for path in isal_includes:
-                    for fileName in os.listdir(path):
-                        if fileName.endswith('.asm'):
-                            shutil.copy(os.path.join(path, fileName), ".")
-                objects.extend(nasmCompiler.compile(asmSources, *args, **nasm_kwargs))
-
-            if cppSources:
-                objects.extend(oldCompile(cppSources, *args, **kwargs))
-
-            if cSources:
-                cppCompileArgs = [
-                    '-fconstexpr-ops-limit=99000100',
-                    '-fconstexpr-steps=99000100',
-                    '-std=c++17',
-                    '/std:c++17',
+                nasm_kwargs['include_dirs'] = [os.path.abspath(path) + os.sep for path in isal_includes]
+                asmIncludes = [
+                    os.path.join(path, fileName)
+                    for path in isal_includes
+                    for fileName in os.listdir(path)
+                    if fileName.endswith('.asm')
                 ]
-                if 'extra_postargs' in kwargs:
-                    kwargs['extra_postargs'] = [x for x in kwargs['extra_postargs'] if x not in cppCompileArgs]
-                objects.extend(oldCompile(cSources, *args, **kwargs))
+
+                # The ISA-L sources do not change between builds but build_ext recompiles all sources of an
+                # extension as soon as a single one is newer than the extension. Only reassemble those objects
+                # that are older than their source or any of the includable .asm files, e.g., for editable
+                # installs that only touched some C++ header.
+                asmObjects = nasmCompiler.object_filenames(
+                    asmSources, strip_dir=0, output_dir=kwargs.get('output_dir', '')
+                )
+                newestInclude = max((os.path.getmtime(path) for path in asmIncludes), default=0)
+                outdatedSources = [
+                    source
+                    for source, asmObject in zip(asmSources, asmObjects)
+                    if self.force
+                    or not os.path.exists(asmObject)
+                    or os.path.getmtime(asmObject) < max(os.path.getmtime(source), newestInclude)
+                ]
+                if outdatedSources:
+                    nasmCompiler.compile(outdatedSources, *args, **nasm_kwargs)
+                objects.extend(asmObjects)
+
+            extension = getattr(self, 'currentExtension', None)
+            hotSources = [os.path.normpath(source) for source in hot_sources]
+
+            def compileSource(source):
+                languageArgs = getattr(
+                    extension, 'extra_compile_args_c' if source.endswith('.c') else 'extra_compile_args_cxx', []
+                )
+                sourceKwargs = dict(kwargs)
+                sourceKwargs['extra_postargs'] = list(kwargs.get('extra_postargs') or []) + languageArgs
+                if os.path.normpath(source) in hotSources:
+                    # Appended last so that they override the hardening flags in extra_postargs.
+                    sourceKwargs['extra_postargs'] += hotSourceArgs
+                return oldCompile([source], *args, **sourceKwargs)
+
+            # The default compile method is serial over all sources. Compile each C and C++ source separately
+            # in a thread pool instead. The threads only wait for the compiler subprocesses.
+            with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                for sourceObjects in executor.map(compileSource, cppSources + cSources):
+                    objects.extend(sourceObjects)
 
             return objects
 
         self.compiler.compile = newCompile
 
+        wrapWithCompilerCache(self.compiler)
+
+        probeCachePath = getProbeCachePath(self.compiler, self.build_temp)
+        loadProbeCache(probeCachePath)
+
+        # fmt: off
+        prefetchProbes(self.compiler, [
+            '-D_FORTIFY_SOURCE=2', '-fconstexpr-ops-limit=99000100', '-fconstexpr-steps=99000100',
+            '-fcf-protection=none',
+        ], ['unistd.h'])
+        # fmt: on
+
+        # There is only one compiler per build_extensions call, so probe these only once for all extensions.
+        unixCompileArgs, unixCxxCompileArgs, unixLinkArgs = [], [], []
+        hotSourceArgs = []
+        if self.compiler.compiler_type not in ['mingw32', 'msvc']:
+            unixCompileArgs, unixCxxCompileArgs, unixLinkArgs = getUnixFlags(self.compiler, self.debug)
+            hotSourceArgs = ['-fno-stack-protector', '-U_FORTIFY_SOURCE']
+            if supportsFlag(self.compiler, '-fcf-protection=none'):
+                hotSourceArgs += ['-fcf-protection=none']
+
         for ext in self.extensions:
             ext.extra_compile_args = [
-                '-std=c++17',
                 '-O3',
                 '-DNDEBUG',
                 '-DWITH_PYTHON_SUPPORT',
                 '-D_LARGEFILE64_SOURCE=1',
-                '-D_GLIBCXX_ASSERTIONS',
             ]
+            # The extra_compile_args are used for all sources while extra_compile_args_cxx and extra_compile_args_c
+            # are only appended by newCompile for sources of the respective language, e.g., for -std=c++17, which
+            # the C compiler would warn about or even reject.
+            ext.extra_compile_args_cxx = ['-std=c++17', '-D_GLIBCXX_ASSERTIONS']
+            ext.extra_compile_args_c = []
             if supportsFlag(self.compiler, '-D_FORTIFY_SOURCE=2'):
                 ext.extra_compile_args += ['-D_FORTIFY_SOURCE=2']
             if withRpmalloc != 'disable':
@@ -314,13 +444,18 @@ class Build(build_ext):
                 ]
 
             elif self.compiler.compiler_type == 'msvc':
+                # setuptools' MSVCCompiler already adds /GL and /LTCG, i.e., link-time code generation. Add the
+                # equivalents of -ffunction-sections -fdata-sections -Wl,--gc-sections so that the linker can drop
+                # and fold unreferenced functions and data.
                 ext.extra_compile_args = [
-                    '/std:c++17',
                     '/O2',
+                    '/Gy',
+                    '/Gw',
                     '/DNDEBUG',
                     '/DWITH_PYTHON_SUPPORT',
-                    '/constexpr:steps99000100',
                 ]
+                ext.extra_link_args = ['/OPT:REF', '/OPT:ICF']
+                ext.extra_compile_args_cxx = ['/std:c++17', '/constexpr:steps99000100']
                 if withRpmalloc != 'disable':
                     ext.extra_compile_args.append('/DWITH_RPMALLOC')
                 if withIsal != 'disable':
@@ -331,32 +466,79 @@ class Build(build_ext):
 
             else:
                 # The default limit is ~33 M (1<<25) and 99 M seem to be enough to compile currently on GCC 11.
+                # The limit is only needed for the constexpr lookup tables of the deflate block finder in
+                # rapidgzip/blockfinder/, i.e., only for the C++ translation unit and not for the C sources.
                 if supportsFlag(self.compiler, '-fconstexpr-ops-limit=99000100'):
-                    ext.extra_compile_args += ['-fconstexpr-ops-limit=99000100']
+                    ext.extra_compile_args_cxx += ['-fconstexpr-ops-limit=99000100']
                 elif supportsFlag(self.compiler, '-fconstexpr-steps=99000100'):
-                    ext.extra_compile_args += ['-fconstexpr-steps=99000100']
+                    ext.extra_compile_args_cxx += ['-fconstexpr-steps=99000100']
 
                 if sys.platform == 'linux':
                     ext.extra_compile_args += ['-D_GNU_SOURCE']
 
-                if sys.platform.startswith('darwin') and supportsFlag(self.compiler, '-mmacosx-version-min=10.14'):
-                    ext.extra_compile_args += ['-mmacosx-version-min=10.14']
-                    ext.extra_link_args += ['-mmacosx-version-min=10.14']
+                if withNative == 'enable':
+                    if supportsFlag(self.compiler, '-march=native'):
+                        ext.extra_compile_args += ['-march=native']
+                    else:
+                        print("[Warning] The compiler does not support -march=native. Will build without it.")
 
-                # Add some hardening. See e.g.:
-                # https://www.phoronix.com/news/GCC-fhardened-Hardening-Option
-                # https://developers.redhat.com/blog/2018/03/21/compiler-and-linker-flags-gcc
-                # I have not observed any performance impact for these.
-                ext.extra_compile_args += ['-fstack-protector-strong']
-                ext.extra_link_args += ['-fstack-clash-protection']
-                # AppleClang seems to not like this flag:
-                if supportsFlag(self.compiler, '-fcf-protection=full'):
-                    ext.extra_compile_args += ['-fcf-protection=full']
+                ext.extra_compile_args += unixCompileArgs
+                ext.extra_compile_args_cxx += unixCxxCompileArgs
+                ext.extra_link_args += unixLinkArgs
 
             if hasInclude(self.compiler, 'unistd.h'):
                 ext.extra_compile_args += ['-DZ_HAVE_UNISTD_H']
 
-        super(Build, self).build_extensions()
+        storeProbeCache(probeCachePath)
+
+        if withPgo == 'enable' and self.compiler.compiler_type not in ['msvc', 'mingw32']:
+            self.buildExtensionsWithProfile()
+        else:
+            super(Build, self).build_extensions()
+
+    def buildExtensionsWithProfile(self):
+        profileDir = os.path.abspath(os.path.join(self.build_temp, 'pgo'))
+        shutil.rmtree(profileDir, ignore_errors=True)
+        os.makedirs(profileDir)
+
+        isClang = 'clang' in getCompilerVersion(self.compiler)
+        profileData = os.path.join(profileDir, 'default.profdata')
+        if isClang:
+            generateFlags = ['-fprofile-instr-generate']
+            useFlags = [f'-fprofile-instr-use={profileData}']
+        else:
+            generateFlags = [f'-fprofile-generate={profileDir}']
+            # Profiles of multi-threaded programs can be slightly inconsistent without atomic counter updates.
+            useFlags = [f'-fprofile-use={profileDir}', '-fprofile-correction']
+
+        originalArgs = [(list(ext.extra_compile_args), list(ext.extra_link_args)) for ext in self.extensions]
+
+        def buildWithFlags(flags):
+            for ext, (compileArgs, linkArgs) in zip(self.extensions, originalArgs):
+                ext.extra_compile_args = compileArgs + flags
+                ext.extra_link_args = linkArgs + flags
+            super(Build, self).build_extensions()
+
+        # Both builds have to recompile everything even if the previously built extension seems up-to-date.
+        self.force = True
+        buildWithFlags(generateFlags)
+
+        print("[Info] Run the instrumented rapidgzip extension to gather a profile.")
+        modulePath = os.path.dirname(os.path.abspath(self.get_ext_fullpath('rapidgzip')))
+        environment = dict(os.environ, LLVM_PROFILE_FILE=os.path.join(profileDir, '%p-%m.profraw'))
+        environment['PYTHONPATH'] = os.pathsep.join([modulePath, environment.get('PYTHONPATH', '')])
+        # Run inside the profile folder so that the 'rapidgzip' source folder is not found as a namespace package.
+        subprocess.run([sys.executable, '-c', pgoTrainingScript], cwd=profileDir, env=environment, check=True)
+
+        if isClang:
+            profrawFiles = [
+                os.path.join(profileDir, name) for name in os.listdir(profileDir) if name.endswith('.profraw')
+            ]
+            profdata = shutil.which('llvm-profdata')
+            mergeCommand = [profdata] if profdata else ['xcrun', 'llvm-profdata']
+            subprocess.run(mergeCommand + ['merge', f'-output={profileData}'] + profrawFiles, check=True)
+
+        buildWithFlags(useFlags)
 
 
 setup(
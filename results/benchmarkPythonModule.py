@@ -1,18 +1,19 @@
 import gzip
+import io
 import os
 import sys
 import time
+import zlib
 
 import indexed_gzip
 import rapidgzip
 
 
 gzipFilePath = sys.argv[1]
-# Determine uncompressed file size
-fileSize = 0
-with gzip.open(gzipFilePath) as file:
-    while result := file.read(4*1024*1024):
-        fileSize += len(result)
+# Determine uncompressed file size. The ISIZE field in the gzip footer is only the size modulo 4 GiB of the last
+# gzip member, so seek to the end with rapidgzip instead, which decompresses the file in parallel.
+with rapidgzip.RapidgzipFile(gzipFilePath, parallelization = 0) as file:
+    fileSize = file.seek(0, io.SEEK_END)
 
 
 # Benchmark default Python gzip implementation
@@ -25,12 +26,53 @@ with gzip.open(gzipFilePath) as file:
     print(f"Decompression time: {gzipDuration:.2f}s, Bandwidth: {fileSize / gzipDuration / 1e6:.0f} MB/s")
 
 
+# Benchmark zlib directly with the 128 KiB read buffer size that the gzip module uses since Python 3.12
+# to show how much of the above is overhead of the gzip module itself.
+print("\n== Benchmark decompression with Python's zlib module ==\n")
+with open(gzipFilePath, 'rb') as file:
+    t0 = time.time()
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    while True:
+        if decompressor.eof:
+            # Start a new decompressor for the next gzip member. The unconsumed tail of a finished decompressor is
+            # stale because all input after the end of the member is moved into unused_data.
+            chunk = decompressor.unused_data or file.read(128*1024)
+            if not chunk:
+                break
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+        elif decompressor.unconsumed_tail:
+            chunk = decompressor.unconsumed_tail
+        else:
+            chunk = file.read(128*1024)
+            if not chunk:
+                # The last call might have stopped at max_length, so decompress the remaining buffered output.
+                while not decompressor.eof and decompressor.decompress(b'', 512*1024):
+                    pass
+                break
+        decompressor.decompress(chunk, 512*1024)
+    zlibDuration = time.time() - t0
+    print(f"Decompression time: {zlibDuration:.2f}s, Bandwidth: {fileSize / zlibDuration / 1e6:.0f} MB/s")
+
+
 # Create index
 if not os.path.exists(gzipFilePath + ".index"):
     with indexed_gzip.IndexedGzipFile(gzipFilePath) as file:
         file.build_full_index()
         file.export_index(gzipFilePath + ".index")
 
+# Read the index only once instead of reopening and rereading it for each benchmark.
+with open(gzipFilePath + ".index", 'rb') as file:
+    indexData = file.read()
+
+# Ask the kernel to keep the compressed file in the page cache so that the measurements do not depend on the
+# benchmark order, i.e., on whether a preceding run had already read the file.
+if hasattr(os, 'posix_fadvise'):
+    fileDescriptor = os.open(gzipFilePath, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fileDescriptor, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fileDescriptor)
+
 
 # Benchmark decompression with rapidgzip with and without index
 # parallelization = 0 means that it is automatically using all available cores.
@@ -39,7 +81,7 @@ for withIndex in [True, False]:
     for parallelization in [0, 1, 2, 6, 12, 24, 32]:
         with rapidgzip.RapidgzipFile(gzipFilePath, parallelization = parallelization) as file:
             if withIndex:
-                file.import_index(open(gzipFilePath + ".index", 'rb'))
+                file.import_index(io.BytesIO(indexData))
 
             t0 = time.time()
             # Unfortunately, the chunk size is very performance critical! It might depend on the cache size.
@@ -9,14 +9,15 @@ import pandas as pd
 
 def plotComparison(filePath):
     data = pd.read_csv(filePath, header=0, sep=';', comment='#')
-    distributions = data['Code Length Distribution'].unique()
+    # Split the table only once instead of filtering it again for each quantity and implementation.
+    groups = [
+        (distribution, sorted(distributionData.groupby('Implementation'), key=lambda group: group[0]))
+        for distribution, distributionData in data.groupby('Code Length Distribution', sort=False)
+    ]
 
     fig = plt.figure(figsize=(9, 12))
     for iQuantity, quantity in enumerate(['Runtime', 'Construction Time', 'Decode Time']):
-        for (iAxis, distribution) in enumerate(distributions):
-            distributionData = data[data['Code Length Distribution'] == distribution]
-            implementations = distributionData['Implementation'].unique()
-
+        for (iAxis, (distribution, implementations)) in enumerate(groups):
             nColumns = 2
             iSubplot = 1 + iQuantity * nColumns + iAxis
             ax = fig.add_subplot(3, nColumns, iSubplot)
@@ -24,8 +25,7 @@ def plotComparison(filePath):
             ax.set_xlabel('Maximum Length')
             ax.set_ylabel(quantity + "/ ms")
 
-            for implementation in sorted(implementations):
-                implementationData = distributionData[distributionData['Implementation'] == implementation]
+            for implementation, implementationData in implementations:
                 plt.errorbar(implementationData['Maximum Length'],
                              implementationData[quantity + ' Average'] * 1e3,
                              implementationData[quantity + ' StdDev'] * 1e3,
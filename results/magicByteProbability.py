@@ -37,31 +37,45 @@ def transition_matrix_for_string_matching( string_to_find, letter_probabilities
     # Also, each state k>0 contains the read letter and therefore is well-defined making the probability to reach it
     # from any other letter either 0 or the probability for the last latter in that state,
     # M[k,l] in {0,p(last letter of l)} for all k>=0 and k<n and l>0 and l<=n.
-    for k in range(n):
-        # The upper minor diagonal are the probabilities that the matched substring grows by one letter, which
-        # is the probability to find the next letter in the string to find
-        M[k,k+1] = p( string_to_find[k] )
-
-        # Each letter only should go to one new state. So if there are multiple possible new states, choose the longest!
-        lettersUsed = { string_to_find[k] }
-        for l in range(1,k+1)[::-1]:
-            letter = string_to_find[l-1]
-            if letter in lettersUsed:
-                continue
-
-            # Consider string_to_find = "ABCABD". Aftter having matched the substring "ABCAB",
-            # the next letter might be a "D" to match "ABCABD", which would be the minor diagonal filled above.
-            # But, it also might be a "C" resulting in the last 6 letters adding up to "ABCABC" and now the
-            # longest matching substring becomes the latter half "ABC". So, we only go back to state k=3.
-            if ( string_to_find[:k] + letter ).endswith( string_to_find[:l] ):
-                lettersUsed |= { letter }
-                M[k,l] = p( letter )
+    # Consider string_to_find = "ABCABD". Aftter having matched the substring "ABCAB",
+    # the next letter might be a "D" to match "ABCABD", which would be the minor diagonal.
+    # But, it also might be a "C" resulting in the last 6 letters adding up to "ABCABC" and now the
+    # longest matching substring becomes the latter half "ABC". So, we only go back to state k=3.
+    # This is exactly the automaton of the Knuth-Morris-Pratt algorithm. failure[k] is the length of the longest
+    # proper prefix of string_to_find[:k], which also is a suffix of it, i.e., the state to fall back to on a mismatch.
+    failure = [ 0 ] * ( n + 1 )
+    for k in range( 2, n + 1 ):
+        fallback = failure[k - 1]
+        while fallback > 0 and string_to_find[fallback] != string_to_find[k - 1]:
+            fallback = failure[fallback]
+        if string_to_find[fallback] == string_to_find[k - 1]:
+            fallback += 1
+        failure[k] = fallback
+
+    # Letters not in string_to_find always lead back to state 0, which is filled in below via the row sums.
+    # Only collect the non-zero transitions (k, l, probability) here and fill them all into M at once afterwards.
+    letters = set( string_to_find )
+    rows = []
+    columns = []
+    probabilities = []
+    for k in range( n ):
+        for letter in letters:
+            l = k
+            while l > 0 and string_to_find[l] != letter:
+                l = failure[l]
+            if string_to_find[l] == letter:
+                l += 1
+            if l > 0:
+                rows.append( k )
+                columns.append( l )
+                probabilities.append( p( letter ) )
+
+    M[rows, columns] = probabilities
 
     # M is a transition matrix and the probability to go to any of the states should add up to 1.
     # This means, the sum over rows should add up to 1, giving us a simply way to calculate the probability
     # we end up with a matched substring of length 0, i.e., column 0, which contains the last elements to be filled in.
-    for k in range(n):
-        M[k,0] = 1 - sum( M[k,1:] )
+    M[:n,0] = 1 - M[:n,1:].sum( axis = 1 )
 
     return M
 
@@ -86,17 +100,41 @@ assert np.all( transition_matrix_for_string_matching( "ACTAGC", { "A": 0.25, "C"
 
 
 def probability_to_find_at_least_one_string( string_to_find, letter_probabilities, number_of_letters_to_search ):
+    """
+    number_of_letters_to_search: A single number or an iterable of numbers, in which case an array with the
+                                 probability for each of them is returned.
+    """
     # Consider a row vector representing the probability for each state at the current time.
     # After adding one more letter, the new probabilities can be derived by right-multiplying with the
     # transition matrix.
     # For finding a string, we start with 100% probability to find a substring of length 0 because we have
     # no letters yet. After adding number_of_letters_to_search letters, we are interested in the probability
     # to find a substring of length equal to string_to_find. Instead of consecutively right-multiplying, the
-    # matrix power is calculated and then only right-multiplied once, which in this case boils down to extracting
-    # the 0-th row from the powered up matrix. And from that we take the len( string_to_find )-th element.
+    # matrix power is calculated via binary exponentiation. The squared matrices M^(2^i) only depend on the
+    # transition matrix, so they are computed once and shared by all requested numbers of letters. For each of those,
+    # only the row vector has to be right-multiplied with the squares selected by the bits of the exponent.
+    # An eigenvalue decomposition M = V diag(w) V^-1 would be even cheaper but it is not accurate enough here.
+    # The results for the 48-bit bzip2 magic bytes were off by ~0.3 % and became negative for short searches.
     M = transition_matrix_for_string_matching( string_to_find, letter_probabilities )
-    # @todo calculate M to the npower of number_of_letters_to_search using eigenvalue decomposition?
-    return np.linalg.matrix_power( M, number_of_letters_to_search )[0,len( string_to_find )]
+
+    exponents = np.atleast_1d( number_of_letters_to_search ).astype( np.uint64 )
+    squares = [ M ]
+    for _ in range( 1, int( exponents.max() ).bit_length() ):
+        squares.append( squares[-1] @ squares[-1] )
+
+    # Stack the row vectors for all exponents into one matrix and advance all of them, whose exponent has the
+    # respective bit set, with a single matrix multiplication per squaring. This is faster than distributing the
+    # independent exponents over processes because the per-exponent work is far too small to amortize that.
+    states = np.zeros( ( len( exponents ), M.shape[0] ) )
+    states[:, 0] = 1
+    for bit, square in enumerate( squares ):
+        selected = ( ( exponents >> np.uint64( bit ) ) & np.uint64( 1 ) ).astype( bool )
+        states[selected] = states[selected] @ square
+    probabilities = states[:, len( string_to_find )]
+
+    if np.ndim( number_of_letters_to_search ) == 0:
+        return probabilities[0]
+    return probabilities
 
 print("Probability to find ACTAGC in a 100k long string: ",
       probability_to_find_at_least_one_string("ACTAGC", { "A": 0.25, "C": 0.125, "G": 0.5, "T": 0.125 }, 100000))
@@ -127,7 +165,8 @@ import matplotlib.pyplot as plt
 
 xmax = 512*1024**4*8  # 512 TiB in bits
 x = ( 10**np.linspace( 0, np.log10( xmax ), 200 ) ).astype( dtype = 'int' )
-y = [ probability_to_find_at_least_one_string( string_to_find, 0.5, n ) for n in x ]
+# Evaluate all points at once so that the transition matrix and its squarings are only computed once.
+y = probability_to_find_at_least_one_string( string_to_find, 0.5, x )
 file = "bz2-magic-bytes-probabilities"
 
 fig = plt.figure()
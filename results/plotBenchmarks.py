@@ -13,6 +13,7 @@ benchmarkLogs = [ os.path.join( folder, file ) for file in os.listdir( folder )
 # Return compilerName and lists of min, max, avg values per commit
 def loadData( filePath ):
     commits = []
+    seenCommits = set()
     minTimes = []
     avgTimes = []
     maxTimes = []
@@ -21,26 +22,29 @@ def loadData( filePath ):
     if label.endswith( suffix ):
         label = label[:-len( suffix )]
     with open( filePath, 'rt' ) as file:
-        for line in file:
-            tokens = line.split( ' ' )
-            if len( tokens ) < 3:
-                continue
+        lines = file.read().splitlines()
 
-            commit = tokens[0][20:-1]
-            if commit in commits:
-                continue
-            commits += [ commit ]
-            if '+-' in tokens:
-                # version 1: [2020-12-06T21-36][bccbedc] 10.164 <= 10.294 +- 0.105 <= 10.475 at version unknown
-                minTimes += [ float( tokens[1] ) ]
-                avgTimes += [ float( tokens[3] ) ]
-                maxTimes += [ float( tokens[7] ) ]
-            else:
-                # version 2: [2020-12-06T23-01][9ca572f] 8.42 8.34 8.49 8.67 8.58
-                times = np.array( [ float( t ) for t in tokens[1:] ] )
-                minTimes += [ np.min( times ) ]
-                avgTimes += [ np.mean( times ) ]
-                maxTimes += [ np.max( times ) ]
+    for line in lines:
+        tokens = line.split( ' ' )
+        if len( tokens ) < 3:
+            continue
+
+        commit = tokens[0][20:-1]
+        if commit in seenCommits:
+            continue
+        seenCommits.add( commit )
+        commits += [ commit ]
+        if '+-' in tokens:
+            # version 1: [2020-12-06T21-36][bccbedc] 10.164 <= 10.294 +- 0.105 <= 10.475 at version unknown
+            minTimes += [ float( tokens[1] ) ]
+            avgTimes += [ float( tokens[3] ) ]
+            maxTimes += [ float( tokens[7] ) ]
+        else:
+            # version 2: [2020-12-06T23-01][9ca572f] 8.42 8.34 8.49 8.67 8.58
+            times = np.array( tokens[1:], dtype = float )
+            minTimes += [ np.min( times ) ]
+            avgTimes += [ np.mean( times ) ]
+            maxTimes += [ np.max( times ) ]
 
     return label, commits, np.array( minTimes ), np.array( avgTimes ), np.array( maxTimes )
 
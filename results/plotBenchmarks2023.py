@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+import matplotlib.cbook
+import matplotlib.mlab
 import matplotlib.patches as mpatches
 import matplotlib.pyplot as plt
 import matplotlib.ticker
@@ -7,7 +9,7 @@ from matplotlib.lines import Line2D
 from matplotlib.ticker import NullFormatter, ScalarFormatter, StrMethodFormatter
 import numpy as np
 import pandas as pd
-import os, sys
+import bisect, concurrent.futures, functools, hashlib, multiprocessing, os, sys, tempfile
 
 
 # Avoid Type 3 fonts as they are, for whatever obnoxious reason, not supported by publishing
@@ -16,7 +18,20 @@ matplotlib.rcParams['pdf.fonttype'] = 42
 matplotlib.rcParams['ps.fonttype'] = 42
 
 
-folder = "." if len(sys.argv) < 2 else sys.argv[1]
+# With --skip-up-to-date, only plots whose PNG or PDF is older than any of the result files are redrawn.
+# With --parallel, the plots are rendered in worker processes and only saved to files instead of being shown.
+# With --cache-dir=<path>, the parsed result files are cached in the given folder instead of the user cache folder.
+options = ['--skip-up-to-date', '--parallel']
+skipUpToDate = '--skip-up-to-date' in sys.argv[1:]
+renderInParallel = '--parallel' in sys.argv[1:]
+cacheOptions = [argument for argument in sys.argv[1:] if argument.startswith('--cache-dir=')]
+cacheFolder = (
+    cacheOptions[-1][len('--cache-dir=') :]
+    if cacheOptions
+    else os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'rapidgzip-plots')
+)
+arguments = [argument for argument in sys.argv[1:] if argument not in options + cacheOptions]
+folder = "." if len(arguments) < 1 else arguments[0]
 
 myImplementationName = "rapidgzip"
 dpi = 300
@@ -55,14 +70,167 @@ colors = {
 
 
 
+@functools.lru_cache(maxsize=None)
+def scanFolder(path):
+    """
+    Returns the stat results for all files in the folder. The result files are only read by this script, so listing
+    each folder once can replace the isfile, stat, and getmtime calls per file, which are each a roundtrip on network
+    file systems.
+    """
+    with os.scandir(path) as entries:
+        return {entry.name: entry.stat() for entry in entries if entry.is_file()}
+
+
+def statResultFile(filePath):
+    return scanFolder(os.path.dirname(filePath) or ".").get(os.path.basename(filePath))
+
+
+def isResultFile(filePath):
+    return statResultFile(filePath) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def loadDataCached(filePath, modificationTime):
+    # Reruns load the binary .npy file written on the first run instead of parsing the text file again.
+    # Memory-map it so that it is paged in on access by the OS instead of being copied into a newly allocated array.
+    # The cache is not written next to the result files because those are in the repository. The path hash
+    # distinguishes equally named result files in different folders.
+    pathHash = hashlib.sha256(os.path.realpath(filePath).encode()).hexdigest()[:16]
+    cachePath = os.path.join(cacheFolder, f"{pathHash}-{os.path.basename(filePath)}.npy")
+    try:
+        cacheStatus = os.stat(cachePath)
+    except FileNotFoundError:
+        cacheStatus = None
+    if cacheStatus is not None and cacheStatus.st_mtime >= modificationTime:
+        data = np.load(cachePath, mmap_mode='r')
+    else:
+        # np.loadtxt tokenizes in Python, which is much slower than the C parser of pandas for larger result files.
+        try:
+            data = pd.read_csv(filePath, sep=r'\s+', header=None, comment='#', dtype=np.float64).to_numpy()
+        except pd.errors.EmptyDataError:
+            data = np.empty((0, 1))
+
+        # Write to a temporary file first, so that an interrupted run cannot leave a truncated cache file behind.
+        try:
+            os.makedirs(cacheFolder, exist_ok=True)
+            fileDescriptor, temporaryPath = tempfile.mkstemp(suffix=".npy", dir=cacheFolder)
+            with os.fdopen(fileDescriptor, 'wb') as file:
+                np.save(file, data)
+            os.replace(temporaryPath, cachePath)
+        except OSError as exception:
+            print("Could not write cache file:", cachePath, exception)
+
+    # The same array is returned to all callers, so make sure that none of them can modify it for the others.
+    data.setflags(write=False)
+    return data
+
+
+def loadData(filePath):
+    """
+    Several plots read the same result files, e.g., the parallel decompression results are shown with and without
+    per-chunk-size grouping. Parse each file only once unless it has changed in the meantime.
+    """
+    return loadDataCached(filePath, statResultFile(filePath).st_mtime)
+
+
+def prefetchData(filePaths):
+    """
+    Loads all existing files concurrently into the cache of loadData. The C parser of pandas releases the GIL,
+    so the plot functions can afterward iterate over their files in order without waiting for each one.
+    """
+    filePaths = [filePath for filePath in filePaths if isResultFile(filePath)]
+    if not filePaths:
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(filePaths))) as executor:
+        # Errors are ignored here and will be raised again by the sequential loadData call in the plot function.
+        for future in [executor.submit(loadData, filePath) for filePath in filePaths]:
+            future.exception()
+
+
+def isUpToDate(outputName, inputPaths):
+    """
+    Make-style dependency check. Returns true if the PNG and PDF for outputName exist and are newer than all of the
+    existing input files. Always returns false if --skip-up-to-date was not specified.
+    """
+    if not skipUpToDate:
+        return False
+    outputPaths = [outputName + ".png", outputName + ".pdf"]
+    inputPaths = [path for path in inputPaths if isResultFile(path)]
+    if not inputPaths:
+        return False
+    # Stat each output only once instead of checking for its existence and querying its modification time separately.
+    try:
+        oldestOutput = min(os.stat(path).st_mtime for path in outputPaths)
+    except FileNotFoundError:
+        return False
+    if max(statResultFile(path).st_mtime for path in inputPaths) > oldestOutput:
+        return False
+    print("Skipping up-to-date plot:", outputName)
+    return True
+
+
+def groupByColumn(data, column, values=None):
+    """
+    Returns a dictionary, which maps each unique value of the given column in ascending order to all rows with that
+    value. This sorts the data once instead of scanning all rows again with a boolean mask for each value.
+    If values is given, then the corresponding elements of it are grouped instead of the rows. This is used to
+    compute derived quantities like bandwidths once for the whole array instead of once per group.
+    """
+    values = data if values is None else values
+    keys = data[:, column]
+    if len(keys) > 0 and keys.min() >= 0 and keys.max() < 2**16 and np.array_equal(np.floor(keys), keys):
+        smallIntegers = keys.astype(np.uint16)
+        # Keys like thread counts or bits per read are small integers. For these, np.bincount yields the group sizes
+        # and the stable argsort of 16-bit integers is a radix sort, i.e., both are O(N) instead of O(N log N).
+        counts = np.bincount(smallIntegers)
+        uniqueKeys = np.flatnonzero(counts)
+        order = np.argsort(smallIntegers, kind='stable')
+        groups = np.split(values[order], np.cumsum(counts[uniqueKeys])[:-1])
+        return dict(zip(uniqueKeys.astype(keys.dtype), groups))
+
+    order = np.argsort(keys, kind='stable')
+    uniqueKeys, starts = np.unique(keys[order], return_index=True)
+    return dict(zip(uniqueKeys, np.split(values[order], starts[1:])))
+
+
+maxViolinSamples = 2000
+
+
+def violinplot(ax, dataset, **kwargs):
+    """
+    Same as ax.violinplot but evaluates the kernel density estimate for each violin on at most maxViolinSamples
+    randomly chosen samples because its cost grows with the number of samples times evaluation points.
+    The kernel bandwidth is still the one from Scott's rule for all samples, so the violins of larger datasets only
+    differ by the sampling noise from the ones computed on all samples. The medians and the extents of the violins
+    are computed from all samples.
+    """
+    random = np.random.default_rng(0)
+
+    def estimateDensity(samples, coordinates):
+        # Same special case as in matplotlib's violinplot because the KDE is not defined for zero variance.
+        if np.all(samples[0] == samples):
+            return (samples[0] == coordinates).astype(float)
+        bandwidthFactor = None
+        if len(samples) > maxViolinSamples:
+            subset = random.choice(samples, maxViolinSamples, replace=False)
+            if not np.all(subset[0] == subset):
+                # GaussianKDE scales the given factor with the standard deviation of the samples it gets.
+                bandwidth = len(samples) ** (-1 / 5) * np.std(samples, ddof=1)
+                bandwidthFactor = bandwidth / np.std(subset, ddof=1)
+                samples = subset
+        return matplotlib.mlab.GaussianKDE(samples, bandwidthFactor).evaluate(coordinates)
+
+    return ax.violin(matplotlib.cbook.violin_stats(dataset, estimateDensity, points=100), **kwargs)
+
+
 def plotBitReaderHistograms():
-    data = np.loadtxt(os.path.join(folder, "result-bitreader-reads.dat"))
+    data = loadData(os.path.join(folder, "result-bitreader-reads.dat"))
 
     fig = plt.figure(figsize=(6, 4))
     ax = fig.add_subplot(111, xlabel="Bandwidth / (MB/s)", ylabel="Frequency", xscale='log')
+    groups = groupByColumn(data, 0, data[:, 1] / data[:, 2] / 1e6)
     for nBits in [1, 2, 8, 16]:
-        subdata = data[data[:, 0] == nBits]
-        bandwidths = subdata[:, 1] / subdata[:, 2] / 1e6
+        bandwidths = groups.get(nBits, np.empty(0))
         ax.hist(bandwidths, bins=20, label=f"{nBits} bits per read")
     ax.legend(loc="best")
     fig.tight_layout()
@@ -73,13 +241,13 @@ def plotBitReaderHistograms():
 
 
 def plotBitReaderSelectedHistogram(nBitsToPlot):
-    data = np.loadtxt(os.path.join(folder, "result-bitreader-reads.dat"))
+    data = loadData(os.path.join(folder, "result-bitreader-reads.dat"))
 
     fig = plt.figure(figsize=(12, 4))
     ax = fig.add_subplot(111, xlabel="Bandwidth / (MB/s)", ylabel="Frequency", xscale='log')
+    groups = groupByColumn(data, 0, data[:, 1] / data[:, 2] / 1e6)
     for nBits in nBitsToPlot:
-        subdata = data[data[:, 0] == nBits]
-        bandwidths = subdata[:, 1] / subdata[:, 2] / 1e6
+        bandwidths = groups.get(nBits, np.empty(0))
         ax.hist(bandwidths, bins=100, label=f"{nBits} bits per read")
     ax.legend(loc="best")
     fig.tight_layout()
@@ -91,19 +259,18 @@ def plotBitReaderSelectedHistogram(nBitsToPlot):
 
 def plotBitReaderBandwidths():
     filePath = os.path.join(folder, "result-bitreader-reads.dat")
-    if not os.path.isfile(filePath):
+    if not isResultFile(filePath) or isUpToDate("bitreader-bandwidths-over-bits-per-read", [filePath]):
         return None
-    data = np.loadtxt(filePath)
+    data = loadData(filePath)
 
     fig = plt.figure(figsize=(6, 3.5))
     ax = fig.add_subplot(111, xlabel="Bits Per Read Call", ylabel="Bandwidth / (MB/s)")
     ax.grid(axis='both')
-    nBitsTested = np.unique(data[:, 0])
-    for nBits in sorted(nBitsTested):
-        subdata = data[data[:, 0] == nBits]
-        bandwidths = subdata[:, 1] / subdata[:, 2] / 1e6
+    groups = groupByColumn(data, 0, data[:, 1] / data[:, 2] / 1e6)
+    nBitsTested = list(groups)
+    for nBits, bandwidths in groups.items():
         #ax.boxplot(runtimes, positions = [nBits], showfliers=False)
-        result = ax.violinplot(bandwidths, positions = [nBits], widths = 1, showextrema = False, showmedians = True)
+        result = violinplot(ax, bandwidths, positions = [nBits], widths = 1, showextrema = False, showmedians = True)
         for body in result['bodies']:
             body.set_zorder(3)
             body.set_alpha(1.0)
@@ -129,20 +296,21 @@ def plotParallelReadingBandwidths():
     for pinning in ["no-pinning", "sequential-pinning", "recursive-pinning"]:
         fileName = f"result-read-file-parallel-{pinning}.dat"
         filePath = os.path.join(folder, fileName)
-        if not os.path.isfile(filePath) or os.stat(filePath).st_size == 0:
+        if not isResultFile(filePath) or statResultFile(filePath).st_size == 0:
             continue
-        data = np.loadtxt(filePath)
+        if isUpToDate(f"filereader-bandwidths-number-of-threads-{pinning}", [filePath]):
+            continue
+        data = loadData(filePath)
 
         fig = plt.figure(figsize=(6, 3.5))
         ax = fig.add_subplot(111, xlabel="Number of Threads", ylabel="Bandwidth / (GB/s)", xscale = 'log')
         ax.grid(axis='both')
-        threadCounts = list(np.unique(data[:, 0]))
-        for threadCount in sorted(threadCounts):
-            subdata = data[data[:, 0] == threadCount]
-            bandwidths = subdata[:, 1] / subdata[:, 3] / 1e9
+        groups = groupByColumn(data, 0, data[:, 1] / data[:, 3] / 1e9)
+        threadCounts = list(groups)
+        for threadCount, bandwidths in groups.items():
             widths = threadCount / 10.
-            result = ax.violinplot(bandwidths, positions = [threadCount], widths = widths,
-                                   showextrema = False, showmedians = True)
+            result = violinplot(ax, bandwidths, positions = [threadCount], widths = widths,
+                                showextrema = False, showmedians = True)
             for body in result['bodies']:
                 body.set_zorder(3)
                 body.set_alpha(1.0)
@@ -170,18 +338,14 @@ def plotParallelReadingBandwidths():
     return figs
 
 
+# Thresholds, which nBytes has to exceed, and the corresponding divisor, precision, and unit to format with.
+byteFormatThresholds = (1e3, 1e5, 1e6, 1e8, 1e9)
+byteFormats = ((1, 1, "B"), (1e3, 1, "kB"), (1e3, 0, "kB"), (1e6, 1, "MB"), (1e6, 0, "MB"), (1e9, 1, "GB"))
+
+
 def formatBytes(nBytes):
-    if nBytes > 1e9:
-        return f"{nBytes/1e9:.1f} GB"
-    if nBytes > 1e8:
-        return f"{nBytes/1e6:.0f} MB"
-    if nBytes > 1e6:
-        return f"{nBytes/1e6:.1f} MB"
-    if nBytes > 1e5:
-        return f"{nBytes/1e3:.0f} kB"
-    if nBytes > 1e3:
-        return f"{nBytes/1e3:.1f} kB"
-    return f"{nBytes:.1f} B"
+    divisor, precision, unit = byteFormats[bisect.bisect_left(byteFormatThresholds, nBytes)]
+    return f"{nBytes/divisor:.{precision}f} {unit}"
 
 
 def plotComponentBandwidths():
@@ -214,38 +378,42 @@ def plotComponentBandwidths():
     statisticsInfo = []
 
     ticks = []
+    if isUpToDate("components-bandwidths", [os.path.join(folder, fileName) for _, fileName in components]):
+        plt.close(fig)
+        return
+    prefetchData([os.path.join(folder, fileName) for _, fileName in components])
     for i, component in enumerate(components[::-1]):
         label, fname = component
         filePath = os.path.join(folder, fname)
-        if not os.path.isfile(filePath):
+        if not isResultFile(filePath):
             continue
 
-        data = np.loadtxt(filePath, ndmin = 2)
+        data = loadData(filePath)
         bandwidths = data[:, 0] / data[:, 1]
+        median = np.median(bandwidths)
 
-        labelWithMedian = f"{label} ({formatBytes( np.median( bandwidths ) )}/s)"
+        labelWithMedian = f"{label} ({formatBytes( median )}/s)"
         ticks.append( (i, labelWithMedian) )
 
         showMedian=False
         if showMedian:
-            statisticsInfo.append( (i, f"{label:19s} & {np.quantile( bandwidths, 0.25 ) / 1e6} & "
-                                       f"{np.median( bandwidths ) / 1e6} & "
-                                       f"{np.quantile( bandwidths, 0.75 ) / 1e6}\\\\") )
+            statisticsInfo.append( f"{label:19s} & {np.quantile( bandwidths, 0.25 ) / 1e6} & "
+                                   f"{median / 1e6} & "
+                                   f"{np.quantile( bandwidths, 0.75 ) / 1e6}\\\\" )
         else:
-            statisticsInfo.append( (i, f"{label:19s} & {np.mean( bandwidths ) / 1e6} & {np.std( bandwidths ) / 1e6}\\\\") )
+            statisticsInfo.append( f"{label:19s} & {np.mean( bandwidths ) / 1e6} & {np.std( bandwidths ) / 1e6}\\\\" )
 
         # Do not show medians because the "violin" is almost as flat as the median line
-        result = ax.violinplot(bandwidths / 1e6, positions = [i], vert = False, widths = [1],
-                               showextrema = False, showmedians = False)
+        result = violinplot(ax, bandwidths / 1e6, positions = [i], vert = False, widths = [1],
+                            showextrema = False, showmedians = False)
         for body in result['bodies']:
             body.set_zorder(3)
             body.set_alpha(1.0)
             body.set_color(colors['blue'])
 
     print("Benchmark & 25th Percentile & Median & 75th Percentile\\\\")
-    statisticsInfo = reversed(sorted(statisticsInfo, key = lambda x: x[0]))
-    for _, info in statisticsInfo:
-        print(info)
+    # The components are iterated in reverse order for the plot, so the statistics only have to be reversed again.
+    print("\n".join(reversed(statisticsInfo)))
 
     if not ticks:
         plt.close(fig)
@@ -289,29 +457,36 @@ def plotParallelDecompression(legacyPrefix, parallelPrefix, outputType='dev-null
     symbols = []
     labels = []
     threadCountsTicks = []
+    if isUpToDate(f"{parallelPrefix}-{outputType}-bandwidths-number-of-threads",
+                  [os.path.join(folder, fileName) for _, fileName, _ in tools]):
+        plt.close(fig)
+        return
+    prefetchData([os.path.join(folder, fileName) for _, fileName, _ in tools])
     for tool, fileName, color in tools:
         filePath=os.path.join(folder, fileName)
-        if not os.path.isfile(filePath):
+        if not isResultFile(filePath):
             print("Skipping missing file:", filePath)
             continue
-        data = np.loadtxt(filePath, ndmin = 2)
+        data = loadData(filePath)
         if data.shape[0] == 0:
             continue
 
         positions = []
         bandwidths = []
         widths = []
-        threadCounts = list(np.unique(data[:, 0]))
+        groups = groupByColumn(data, 0, data[:, 1] / data[:, 2] / 1e6)
+        threadCounts = list(groups)
         if len(threadCounts) > len(threadCountsTicks):
             threadCountsTicks = threadCounts
 
         if 'igzip' in tool:
             threadCounts = [1]
 
-        for threadCount in sorted(threadCounts):
-            subdata = data[data[:, 0] == threadCount]
-            bandwidths.append(subdata[:, 1] / subdata[:, 2] / 1e6)
+        for threadCount in threadCounts:
+            bandwidths.append(groups.get(threadCount, np.empty(0)))
             positions.append(threadCount)
+        # Compute the medians only once for the printed statistics, the reference lines, and the ideal scaling.
+        medians = dict(zip(positions, [np.median(bandwidth) for bandwidth in bandwidths]))
 
         if tool.startswith('gzip'):
             print(f"Gzip speed: {np.median( bandwidths ):.2f} MB/s")
@@ -320,19 +495,17 @@ def plotParallelDecompression(legacyPrefix, parallelPrefix, outputType='dev-null
             print(f"igzip speed: {np.median( bandwidths ):.2f} MB/s")
 
         if tool.startswith('igzip'):
-            ax.axhline(np.median(bandwidths[0]), color = color, linestyle = '-.', alpha = alpha)
+            ax.axhline(medians[positions[0]], color = color, linestyle = '-.', alpha = alpha)
 
         if tool.startswith('gzip'):
-            ax.axhline(np.median(bandwidths[0]), color = color, linestyle = ':', alpha = alpha)
+            ax.axhline(medians[positions[0]], color = color, linestyle = ':', alpha = alpha)
 
         if tool.startswith( myImplementationName ) or tool.startswith('pugz') or tool.startswith('pigz'):
-            for i in range(len(bandwidths)):
-                count = positions[i]
-                bandwidth = bandwidths[i]
-                print(f"{tool} speed: {np.median( bandwidth ):.2f} MB/s for {count} cores")
+            for count, median in medians.items():
+                print(f"{tool} speed: {median:.2f} MB/s for {count} cores")
 
-        result = ax.violinplot(bandwidths, positions = positions, widths = np.array(positions) / 10.,
-                               showextrema = False, showmedians = False)
+        result = violinplot(ax, bandwidths, positions = positions, widths = np.array(positions) / 10.,
+                            showextrema = False, showmedians = False)
         for body in result['bodies']:
             body.set_zorder(3)
             body.set_alpha(alpha)
@@ -349,9 +522,7 @@ def plotParallelDecompression(legacyPrefix, parallelPrefix, outputType='dev-null
         # Add ideal scaling for comparison
         if fileName == f"{parallelPrefix}-pragzip-index-{outputType}.dat":
             threadCount = 1
-            subdata = data[data[:, 0] == threadCount]
-            bandwidths = subdata[:, 1] / subdata[:, 2] / 1e6
-            ax.plot(threadCountsTicks, np.median(bandwidths) * np.array(threadCountsTicks), linestyle = '--',
+            ax.plot(threadCountsTicks, medians.get(threadCount, np.nan) * np.array(threadCountsTicks), linestyle = '--',
                     color = colors['rosa'], alpha = alpha)
             symbols.append(Line2D([0], [0], color = colors['rosa'], alpha = alpha, linestyle = '--'))
             labels.append("linear scal. (index)")
@@ -394,25 +565,30 @@ def plotParallelDecompressionPerChunkSize(legacyPrefix, parallelPrefix, outputTy
     symbols = []
     labels = []
     threadCountsTicks = []
+    if isUpToDate(f"{parallelPrefix}-{outputType}-bandwidths-number-of-threads-varying-chunk-sizes",
+                  [os.path.join(folder, fileName) for _, fileName, _ in tools]):
+        plt.close(fig)
+        return
+    prefetchData([os.path.join(folder, fileName) for _, fileName, _ in tools])
     for tool, fileName, color in tools:
         filePath=os.path.join(folder, fileName)
-        if not os.path.isfile(filePath):
+        if not isResultFile(filePath):
             print("Skipping missing file:", filePath)
             continue
-        data = np.loadtxt(filePath, ndmin = 2)
+        data = loadData(filePath)
         if data.shape[0] == 0:
             continue
 
         positions = []
         bandwidths = []
         widths = []
-        threadCounts = list(np.unique(data[:, 0]))
+        groups = groupByColumn(data, 0, data[:, 1] / data[:, 2] / 1e6)
+        threadCounts = list(groups)
         if len(threadCounts) > len(threadCountsTicks):
             threadCountsTicks = threadCounts
 
-        for threadCount in sorted(threadCounts):
-            subdata = data[data[:, 0] == threadCount]
-            bandwidth = subdata[:, 1] / subdata[:, 2] / 1e6
+        for threadCount in threadCounts:
+            bandwidth = groups.get(threadCount, np.empty(0))
             if fastestPragzipSingle is None:
                 fastestPragzipSingle = bandwidth
             bandwidths.append(np.array(bandwidth) / fastestPragzipSingle / threadCount)
@@ -423,8 +599,8 @@ def plotParallelDecompressionPerChunkSize(legacyPrefix, parallelPrefix, outputTy
                 count = positions[i]
                 bandwidth = bandwidths[i]
 
-        result = ax.violinplot(bandwidths, positions = positions, widths = np.array(positions) / 10.,
-                               showextrema = False, showmedians = False)
+        result = violinplot(ax, bandwidths, positions = positions, widths = np.array(positions) / 10.,
+                            showextrema = False, showmedians = False)
         for body in result['bodies']:
             body.set_zorder(3)
             body.set_alpha(alpha)
@@ -473,12 +649,17 @@ def plotChunkSizes():
     xTicks = []
     minBandwidth = float('+inf')
     maxBandwidth = float('-inf')
+    if isUpToDate("decompression-chunk-size-bandwidths-number-of-threads",
+                  [os.path.join(folder, fileName) for _, fileName, _ in tools]):
+        plt.close(fig)
+        return
+    prefetchData([os.path.join(folder, fileName) for _, fileName, _ in tools])
     for tool, fileName, color in tools:
         filePath = os.path.join(folder, fileName)
-        if not os.path.isfile(filePath):
+        if not isResultFile(filePath):
             print("Ignore missing file:", filePath)
             continue
-        data = np.loadtxt(filePath, ndmin = 2)
+        data = loadData(filePath)
         if data.shape[0] == 0 or data.shape[1] == 0:
             print("Ignore file with no valid rows:", filePath)
             continue
@@ -486,21 +667,21 @@ def plotChunkSizes():
         positions = []
         bandwidths = []
         widths = []
-        chunkSizes = list(np.unique(data[:, 1]))
+        groups = groupByColumn(data, 1, data[:, 2] / data[:, 3] / 1e6)
+        chunkSizes = list(groups)
         print(chunkSizes)
         if len(chunkSizes) > len(xTicks):
             xTicks = np.array(chunkSizes) / 1024.**2
 
-        for chunkSize in sorted(chunkSizes):
-            subdata = data[data[:, 1] == chunkSize]
-            bandwidths.append(subdata[:, 2] / subdata[:, 3] / 1e6)
+        for chunkSize, chunkBandwidths in groups.items():
+            bandwidths.append(chunkBandwidths)
             positions.append(chunkSize / 1024.**2)
 
         minBandwidth = min(minBandwidth, np.min(bandwidths))
         maxBandwidth = max(maxBandwidth, np.max(bandwidths))
 
-        result = ax.violinplot(bandwidths, positions = positions, widths = np.array(positions) / 10.,
-                               showextrema = False, showmedians = False)
+        result = violinplot(ax, bandwidths, positions = positions, widths = np.array(positions) / 10.,
+                            showextrema = False, showmedians = False)
         for body in result['bodies']:
             body.set_zorder(3)
             body.set_alpha(alpha)
@@ -563,7 +744,7 @@ def properRounding(mean, uncertainty):
 
 def plotCompressionLevelBandwidths():
     filePath = os.path.join(folder, "compression-levels-pragzip-dev-null.dat")
-    if not os.path.isfile(filePath):
+    if not isResultFile(filePath) or isUpToDate("rapidgzip-compressor-comparison", [filePath]):
         return
 
     data = pd.read_csv(filePath, header=None, sep=';', comment='#')
@@ -574,13 +755,15 @@ def plotCompressionLevelBandwidths():
     data['bandwidths'] = data['size'] / data['time'] / 1e9
     grouped = data.groupby(['tool', 'P'])
 
-    # For those values that should be equal inside one group
-    medians = grouped.median()
-
-    result = pd.DataFrame()
-    result['mean bandwidth'] = grouped.mean()['bandwidths']
-    result['stddev bandwidth'] = grouped.std()['bandwidths']
-    result['compression ratio'] = ( medians['size'] / medians['csize'] ).round( 2 )
+    # Compute all statistics in a single pass over the groups. Use the medians for the sizes because those should
+    # be equal inside one group anyway.
+    result = grouped.agg(**{
+        'mean bandwidth': ('bandwidths', 'mean'),
+        'stddev bandwidth': ('bandwidths', 'std'),
+        'size': ('size', 'median'),
+        'csize': ('csize', 'median'),
+    })
+    result['compression ratio'] = ( result.pop('size') / result.pop('csize') ).round( 2 )
 
     print(result)
 
@@ -635,7 +818,7 @@ def plotCompressionLevelBandwidths():
 
 def plotCompressionFormatBandwidths():
     filePath = os.path.join(folder, "compression-formats-dev-null.dat")
-    if not os.path.isfile(filePath):
+    if not isResultFile(filePath) or isUpToDate("rapidgzip-compression-format-comparison", [filePath]):
         return
 
     data = pd.read_csv(filePath, header=None, sep=';', comment='#')
@@ -644,7 +827,9 @@ def plotCompressionFormatBandwidths():
 
     data = data.set_axis(['compressor', 'tool', 'P', 'size', 'time', 'csize'], axis = 1)
     # Without regex = True, it would only replace exact matches not substrings.
-    data = data.replace({
+    # Only apply the patterns to the string columns instead of also testing every number against them.
+    stringColumns = ['compressor', 'tool']
+    data[stringColumns] = data[stringColumns].replace({
         ' -o /dev/null': '',
         ' -k': '',
         ' -c': '',
@@ -656,13 +841,15 @@ def plotCompressionFormatBandwidths():
     data['bandwidths'] = data['size'] / data['time'] / 1e9
     grouped = data.groupby(['P', 'compressor', 'tool'])
 
-    # For those values that should be equal inside one group
-    medians = grouped.median()
-
-    result = pd.DataFrame()
-    result['mean bandwidth'] = grouped.mean()['bandwidths']
-    result['stddev bandwidth'] = grouped.std()['bandwidths']
-    result['compression ratio'] = ( medians['size'] / medians['csize'] ).round( 2 )
+    # Compute all statistics in a single pass over the groups. Use the medians for the sizes because those should
+    # be equal inside one group anyway.
+    result = grouped.agg(**{
+        'mean bandwidth': ('bandwidths', 'mean'),
+        'stddev bandwidth': ('bandwidths', 'std'),
+        'size': ('size', 'median'),
+        'csize': ('csize', 'median'),
+    })
+    result['compression ratio'] = ( result.pop('size') / result.pop('csize') ).round( 2 )
 
     print(result)
 
@@ -743,22 +930,49 @@ def plotCompressionFormatBandwidths():
     fig.savefig("rapidgzip-compression-format-comparison.png", dpi=150)
 
 
+def runPlot(plot):
+    # Worker processes only write the files, so do not let them open windows of an interactive backend.
+    plt.switch_backend('Agg')
+    function, functionArguments = plot
+    function(*functionArguments)
+    plt.close('all')
+
+
 if __name__ == "__main__":
     # Old tests as to how to plot but the samples correctly but violing plots are sufficient
     #plotBitReaderHistograms()
     #plotBitReaderSelectedHistogram([24])
 
-    plotChunkSizes()
-    plotParallelDecompression("result-decompression-fastq", "result-parallel-decompression-fastq", "dev-null")
-    plotParallelDecompression("result-decompression-base64", "result-parallel-decompression-base64", "dev-null")
-    plotParallelDecompression("result-decompression-silesia", "result-parallel-decompression-silesia", "dev-null")
-    plotParallelDecompressionPerChunkSize("result-decompression-base64", "result-parallel-decompression-base64", "dev-null")
-    plotParallelDecompressionPerChunkSize("result-decompression-silesia", "result-parallel-decompression-silesia", "dev-null")
-    plotParallelReadingBandwidths()
-    plotBitReaderBandwidths()
-    plotComponentBandwidths()
-
-    plotCompressionLevelBandwidths()
-    plotCompressionFormatBandwidths()
+    plots = [
+        (plotChunkSizes, ()),
+        (plotParallelDecompression, ("result-decompression-fastq", "result-parallel-decompression-fastq", "dev-null")),
+        (plotParallelDecompression,
+         ("result-decompression-base64", "result-parallel-decompression-base64", "dev-null")),
+        (plotParallelDecompression,
+         ("result-decompression-silesia", "result-parallel-decompression-silesia", "dev-null")),
+        (plotParallelDecompressionPerChunkSize,
+         ("result-decompression-base64", "result-parallel-decompression-base64", "dev-null")),
+        (plotParallelDecompressionPerChunkSize,
+         ("result-decompression-silesia", "result-parallel-decompression-silesia", "dev-null")),
+        (plotParallelReadingBandwidths, ()),
+        (plotBitReaderBandwidths, ()),
+        (plotComponentBandwidths, ()),
+
+        (plotCompressionLevelBandwidths, ()),
+        (plotCompressionFormatBandwidths, ()),
+    ]
 
-    plt.show()
+    if renderInParallel:
+        # The plots are independent of each other and each one spends most of its time in matplotlib.
+        with multiprocessing.Pool() as pool:
+            pool.map(runPlot, plots, chunksize=1)
+    else:
+        # Without a display, e.g., in CI, matplotlib falls back to a non-interactive backend and plt.show would only
+        # keep all figures and their violin artists alive until the end. Free each plot directly after saving instead.
+        showFigures = plt.get_backend().lower() not in ['agg', 'cairo', 'pdf', 'pgf', 'ps', 'svg', 'template']
+        for function, functionArguments in plots:
+            function(*functionArguments)
+            if not showFigures:
+                plt.close('all')
+        if showFigures:
+            plt.show()
@@ -11,40 +11,42 @@ if len(sys.argv) < 2:
     print("Please specify the folder containing the benchmark logs!")
 folder = sys.argv[1]
 suffix = '-commit-timings.dat'
-benchmarkLogs = [os.path.join(folder, file) for file in os.listdir(folder) if file.endswith(suffix)]
+# The directory entries already know their type, so is_file does not need another stat call on most systems.
+with os.scandir(folder) as entries:
+    benchmarkLogs = [entry.path for entry in entries if entry.name.endswith(suffix) and entry.is_file()]
 
 
 # Return compilerName and lists of min, max, avg values per commit
 def loadData(filePath):
-    commits = []
-    minTimes = []
-    avgTimes = []
-    maxTimes = []
-
     label = filePath.split('/')[-1]
     if label.endswith(suffix):
         label = label[: -len(suffix)]
     with open(filePath, 'rt') as file:
-        for line in file:
-            # Line: 9236b2d39c339991bf2f395636b53d98e0f227d9 1.723 1.737 1.765 1.744 1.757 1.678 1.705 1.737 1.738 1.692
-            tokens = line.split(' ')
-            if len(tokens) < 3:
-                continue
-
-            times = np.array([float(t) for t in tokens[1:]])
-            if np.max(times) < 0.2:
-                commits.append(tokens[0][0:9])
-                minTimes.append(float('nan'))
-                avgTimes.append(float('nan'))
-                maxTimes.append(float('nan'))
-                continue
-
-            commits.append(tokens[0][0:9])
-            minTimes.append(np.min(times))
-            avgTimes.append(np.mean(times))
-            maxTimes.append(np.max(times))
-
-    return label, commits, np.array(minTimes), np.array(avgTimes), np.array(maxTimes)
+        # Line: 9236b2d39c339991bf2f395636b53d98e0f227d9 1.723 1.737 1.765 1.744 1.757 1.678 1.705 1.737 1.738 1.692
+        rows = [tokens for tokens in (line.split(' ') for line in file) if len(tokens) >= 3]
+
+    commits = [tokens[0][0:9] for tokens in rows]
+
+    # Gather all timings into one matrix, padded with NaN for rows with fewer repetitions, so that the statistics
+    # can be computed for all commits at once instead of creating an array for each of them.
+    times = np.full((len(rows), max((len(tokens) - 1 for tokens in rows), default=0)), np.nan)
+    for i, tokens in enumerate(rows):
+        times[i, : len(tokens) - 1] = [float(t) for t in tokens[1:]]
+
+    if times.size == 0:
+        return label, commits, np.empty(0), np.empty(0), np.empty(0)
+
+    maxTimes = np.nanmax(times, axis=1)
+    minTimes = np.nanmin(times, axis=1)
+    avgTimes = np.nanmean(times, axis=1)
+
+    # Hide commits whose runs all finished in less than 0.2 s, e.g., because they failed.
+    failed = maxTimes < 0.2
+    minTimes[failed] = float('nan')
+    avgTimes[failed] = float('nan')
+    maxTimes[failed] = float('nan')
+
+    return label, commits, minTimes, avgTimes, maxTimes
 
 yMin = float('+inf')
 yMax = float('-inf')
@@ -166,16 +168,19 @@ transform = ax.get_xaxis_transform()
 
 
 shortCommitLength = len(lastFunctionCommitPerVersion[0][0])
-shortCommits = [c[:shortCommitLength] for c in commits]
+# Map each short commit to the x position of its first occurrence instead of scanning the list for each annotation.
+commitPositions = {}
+for i, commit in enumerate(commits):
+    commitPositions.setdefault(commit[:shortCommitLength], 1 + i)
+# Labels left of this commit are left-aligned, all others are right-aligned.
+alignmentPivot = commitPositions.get('dd678c7c', len(commits) + 1) - 1
 for commit, linestyle, position, label in lastFunctionCommitPerVersion:
-    try:
-        x = 1 + shortCommits.index(commit)
-        ax.axvline(x, color='k', linestyle=linestyle)
-        ax.text(x, position, label, transform=transform, wrap=True, linespacing=0.9, verticalalignment='top',
-                horizontalalignment='left' if x < shortCommits.index('dd678c7c') else 'right')
-
-    except ValueError:
-        pass
+    x = commitPositions.get(commit)
+    if x is None:
+        continue
+    ax.axvline(x, color='k', linestyle=linestyle)
+    ax.text(x, position, label, transform=transform, wrap=True, linespacing=0.9, verticalalignment='top',
+            horizontalalignment='left' if x < alignmentPivot else 'right')
 
 ax.legend(loc='upper left')
 fig.tight_layout()
@@ -6,7 +6,8 @@ import sys
 
 file = sys.argv[1]  # "counts-2B.dat"
 
-data = np.genfromtxt( file, dtype = 'int' ).transpose()
+# np.loadtxt parses in C since NumPy 1.23 while np.genfromtxt still handles each line in Python.
+data = np.loadtxt( file, dtype = 'int', ndmin = 2, unpack = True )
 
 fig = plt.figure()
 ax = fig.add_subplot( 111, yscale = 'log' )
@@ -15,15 +16,20 @@ fig.tight_layout()
 fig.savefig( file + ".pdf" )
 fig.savefig( file + ".png" )
 
-iSorted = np.argsort( data[1] )
-sortedPatterns = data[0][iSorted]
-sortedFrequencies = data[1][iSorted]
+# Only the most and least common patterns are printed, so a partial sort is sufficient for histograms with 2^24 bins.
+patterns, frequencies = data
+nToPrint = min( 10, len( frequencies ) // 2 )
+if nToPrint > 0:
+    iMostCommon = np.argpartition( frequencies, len( frequencies ) - nToPrint )[len( frequencies ) - nToPrint:]
+    iMostCommon = iMostCommon[np.argsort( frequencies[iMostCommon] )[::-1]]
+    iLeastCommon = np.argpartition( frequencies, nToPrint )[:nToPrint]
+    iLeastCommon = iLeastCommon[np.argsort( frequencies[iLeastCommon] )]
 
-print( "Most and least common patterns:" )
-for i in range( 1, min( 10, len( sortedPatterns ) / 2 ) ):
-    print( f"0x{sortedPatterns[-i]:06x} -> {sortedFrequencies[-i]}" )
-print( "..." )
-for i in range( min( 10, len( sortedPatterns ) / 2 ) ):
-    print( f"0x{sortedPatterns[i]:06x} -> {sortedFrequencies[i]}" )
+    print( "Most and least common patterns:" )
+    for i in iMostCommon:
+        print( f"0x{patterns[i]:06x} -> {frequencies[i]}" )
+    print( "..." )
+    for i in iLeastCommon:
+        print( f"0x{patterns[i]:06x} -> {frequencies[i]}" )
 
 #plt.show()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import bisect
 import bz2
 import collections
 import concurrent.futures
@@ -64,6 +65,12 @@ def checkDecompressionBytewise(rawFile, decompressedFile, bufferSize):
                     oldPos1, oldPos2, rawFile.tell(), decFile.tell(), data1.hex(), data2.hex()
                 )
             )
+            commonSize = min(len(data1), len(data2))
+            differences = np.flatnonzero(
+                np.frombuffer(data1, dtype=np.uint8, count=commonSize)
+                != np.frombuffer(data2, dtype=np.uint8, count=commonSize)
+            )
+            print("First mismatching byte at pos", oldPos1 + (differences[0] if len(differences) > 0 else commonSize))
             print("Block offsets:")
             pprint.pprint(decFile.block_offsets())
 
@@ -72,11 +79,13 @@ def checkDecompressionBytewise(rawFile, decompressedFile, bufferSize):
             raise Exception("Data mismatches!")
 
 
-def checkDecompression(rawFile, compressedFile, decompressedFile, bufferSize):
-    checkedSeek(rawFile, 0)
+def checkDecompression(rawFile, compressedFile, decompressedFile, bufferSize, rawDigest=None):
+    if rawDigest is None:
+        checkedSeek(rawFile, 0)
+        rawDigest = sha1_160(rawFile)
 
     sha1 = sha1_160(decompressedFile, bufferSize)
-    sha2 = sha1_160(rawFile)
+    sha2 = rawDigest
 
     if sha1 != sha2:
         print("SHA1 mismatches:", sha1.hex(), sha2.hex())
@@ -143,10 +152,13 @@ def createRandomCompressedFile(sizeInBytes, compressionLevel, encoder):
 
 
 def createStripedCompressedFile(sizeInBytes, compressionLevel, encoder, sequenceLength):
-    data = b''
-    while len(data) < sizeInBytes:
-        for char in [b'A', b'B']:
-            data += char * min(sequenceLength if sequenceLength else sizeInBytes, sizeInBytes - len(data))
+    # Repeat one period of alternating sequences instead of appending each sequence to an ever-growing bytes object,
+    # which would be quadratic in the size for short sequences.
+    if not sequenceLength:
+        data = b'A' * sizeInBytes
+    else:
+        period = b'A' * sequenceLength + b'B' * sequenceLength
+        data = (period * (sizeInBytes // len(period) + 1))[:sizeInBytes]
 
     return writeCompressedFile(data, compressionLevel=compressionLevel, encoder=encoder)
 
@@ -183,6 +195,10 @@ def testDecompression(parameters):
 
     CompressedFileReader = parameters.CompressedFile
 
+    # The raw data does not change between the buffer sizes, so only hash it once.
+    checkedSeek(rawFile, 0)
+    rawDigest = sha1_160(rawFile)
+
     t0 = time.time()
     for bufferSize in parameters.bufferSizes:
         t1 = time.time()
@@ -190,15 +206,21 @@ def testDecompression(parameters):
             print("Testing", parameters, "and buffer size", bufferSize)
 
         try:
-            checkDecompression(rawFile, compressedFile, CompressedFileReader(compressedFile.name), bufferSize)
+            checkDecompression(
+                rawFile, compressedFile, CompressedFileReader(compressedFile.name), bufferSize, rawDigest
+            )
         except Exception as e:
             print("Test for", parameters, "and buffer size", bufferSize, "failed")
             storeFiles(rawFile, compressedFile, str(parameters), parameters.extension)
             raise e
 
     if parameters.size > 0:
+        # The legacy global RNG state is copied into each forked worker process, which would then all test the same
+        # sequence of seek positions. A new generator is seeded from the operating system instead.
+        generator = np.random.default_rng()
+
         decompressedFile = CompressedFileReader(compressedFile.name, parameters.parallelization)
-        for seekPos in np.append(np.random.randint(0, parameters.size), [0, parameters.size - 1]):
+        for seekPos in [generator.integers(0, parameters.size), 0, parameters.size - 1]:
             try:
                 checkSeek(rawFile, decompressedFile, seekPos)
             except Exception as e:
@@ -219,7 +241,7 @@ def testDecompression(parameters):
             offsets = decompressedFile.block_offsets()
 
         # Check seeking after loading offsets
-        for seekPos in np.append(np.random.randint(0, parameters.size), [0, parameters.size - 1]):
+        for seekPos in [generator.integers(0, parameters.size), 0, parameters.size - 1]:
             try:
                 decompressedFile = CompressedFileReader(compressedFile.name, parallelization=parameters.parallelization)
                 if hasattr(decompressedFile, 'import_index'):
@@ -289,12 +311,8 @@ def testPythonInterface(openIndexedFileFromName, compressionLevel, encoder, clos
 
 
 def commandExists(name):
-    try:
-        subprocess.call([name, "-h"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    except FileNotFoundError:
-        return False
-
-    return True
+    # Only look up the executable in PATH instead of spawning it.
+    return shutil.which(name) is not None
 
 
 def openFileAsBytesIO(name):
@@ -364,8 +382,9 @@ def testTriggerDeadlock(filePath):
 
 def testDeadlock(encoder):
     print("Create test file...")
-    # We need at least something larger than the chunk size.
-    rawFile, compressedFile = createRandomCompressedFile(100 * 1024 * 1024, 6, encoder)
+    # We need at least something larger than the chunk size. Random data is stored in uncompressed deflate blocks at
+    # any compression level, so use level 0, which skips the futile match search and is ~10x faster to create.
+    rawFile, compressedFile = createRandomCompressedFile(100 * 1024 * 1024, 0, encoder)
 
     task = multiprocessing.Process(target=testTriggerDeadlock, args=(compressedFile.name,))
     task.start()
@@ -476,22 +495,33 @@ if __name__ == '__main__':
         encoders += ['pbzip2']
 
     bufferSizes = [-1, 128, 333, 500, 1024, 1024 * 1024, 64 * 1024 * 1024]
+
+    def getPatternSizes(size):
+        # All pattern sizes larger than or equal to the size result in the same data consisting only of 'A's.
+        # Only keep the smallest of those to avoid testing identical files multiple times.
+        patternSizes = [1, 2, 8, 123, 257, 2048, 100000]
+        return patternSizes[: bisect.bisect_left(patternSizes, size) + 1]
+
     parameters = [
         TestParameters(size, encoder, compressionLevel, pattern, patternSize, bufferSizes, 1, 'bz2', IndexedBzip2File)
         for size in [1, 2, 3, 4, 5, 10, 20, 30, 100, 1000, 10000, 100000, 200000, 0]
         for encoder in encoders
         for compressionLevel in range(1, 9 + 1)
         for pattern in ['random', 'sequences']
-        for patternSize in ([None] if pattern == 'random' else [1, 2, 8, 123, 257, 2048, 100000])
+        for patternSize in ([None] if pattern == 'random' else getPatternSizes(size))
     ]
     parameters += [
         TestParameters(size, 'pygzip', compressionLevel, pattern, patternSize, bufferSizes, 1, 'gz', RapidgzipFile)
         for size in [1, 2, 3, 4, 5, 10, 20, 30, 100, 1000, 10000, 100000, 200000, 0]
         for compressionLevel in range(1, 9 + 1)
         for pattern in ['random', 'sequences']
-        for patternSize in ([None] if pattern == 'random' else [1, 2, 8, 123, 257, 2048, 100000])
+        for patternSize in ([None] if pattern == 'random' else getPatternSizes(size))
     ]
 
+    # Start with the largest inputs so that the pool does not end up waiting on a few long tests at the end.
+    # This only helps because executor.map hands out the parameters one at a time, i.e., with the default chunksize.
+    parameters.sort(key=lambda x: x.size, reverse=True)
+
     for parallelization in [1, 2, 3, 8]:
         print(f"Will test { parallelization }-parallelization with { len( parameters ) } different bzip2 files")
         parameters = [x._replace(parallelization=parallelization) for x in parameters]